@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Startup materialisation benchmark: rows/s of LZDB(conn).
+
+Fills a measurement collection (with a reference to a satellite
+collection) up to --rows rows, then times full loads of the database.
+Run it against an otherwise empty database.
+
+    python benchmarks/load.py --dbname bench --rows 200000
+"""
+
+import argparse
+import time
+
+import psycopg as pg
+from lzdb import LZDB
+
+
+def populate(conn, rows):
+    dbms = LZDB(conn)
+
+    sat = dbms.ensure(bench_name="BENCH_SAT")
+    sample = dbms.ensure(
+        bench_satellite=sat,
+        bench_param="2004",
+        bench_time="2000-01-03 00:00:00"
+    )
+
+    dbms.commit()
+
+    table = sample.collection().id()
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM {table}")
+    missing = rows - cur.fetchone()[0]
+
+    if missing > 0:
+        cur.execute(f"""
+            INSERT INTO {table}(bench_satellite, bench_param, bench_time)
+            SELECT %s, (2000 + n %% 50)::varchar, '2000-01-03 00:00:00'
+            FROM generate_series(1, %s) AS n
+        """, (sat.id(), missing))
+
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dbname", default="test")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = pg.connect(dbname=args.dbname, host=args.host)
+
+    populate(conn, args.rows)
+
+    best = None
+
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        dbms = LZDB(conn)
+        elapsed = time.perf_counter() - start
+
+        count = len(dbms.items())
+        best = elapsed if best is None else min(best, elapsed)
+
+        conn.rollback()
+
+    print(f"{count} rows loaded in {best:.2f}s: {count / best:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
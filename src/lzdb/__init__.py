@@ -1 +1,2 @@
 from lzdb.lzdb import *
+from lzdb.aio import AsyncLZDB
@@ -0,0 +1,232 @@
+################################################################################
+#
+#  Copyright (C) 2019 Fabien Bouleau
+#
+#  This file is part of lzdb.
+#
+# lzdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lzdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with lzdb. If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+import asyncio
+import contextlib
+import itertools
+
+from .constants import *
+from .lzdb import LZDB
+from .steps import arun
+
+class AsyncLZDB(LZDB):
+    """
+    LZDB for asyncio, on a psycopg AsyncConnection or an
+    AsyncConnectionPool. Items and collections are those of LZDB;
+    the methods reading or writing the database are coroutines:
+
+        dbms = await AsyncLZDB.connect(aconn, lazy=True)
+        item = dbms.newItem(name="SAT1")
+        await dbms.commit()
+        await dbms.linkedItems(item)
+
+        async for item in dbms.iterItems(collection):
+            ...
+
+    query() and neighbours() (no link cache) are synchronous only.
+    """
+    __cursors = itertools.count(1)
+    __commitLock = None
+    __loadLock = None
+    __connecting = False
+
+    # Not available on AsyncLZDB
+    query = None
+    neighbours = None
+
+    def __init__(self, conn, traceon = False, lazy = False, undirected_once = False):
+        super().__init__(conn, traceon=traceon, lazy=lazy, undirected_once=undirected_once)
+
+        # Commits run one at a time; a collection is read once
+        self.__commitLock = asyncio.Lock()
+        self.__loadLock = asyncio.Lock()
+
+    def _start(self):
+        # The inventory is read by connect()
+        if not self.__connecting:
+            raise ValueError("AsyncLZDB is created by: await AsyncLZDB.connect(conn)")
+
+    @classmethod
+    async def connect(cls, conn, **kwargs):
+        """
+        AsyncLZDB(conn, **kwargs), once the inventory (and the rows,
+        unless lazy) is read.
+        """
+        dbms = cls.__new__(cls)
+        dbms.__connecting = True
+        dbms.__init__(conn, **kwargs)
+
+        async with dbms.connection() as aconn:
+            await arun(aconn.cursor(), dbms._startSteps())
+
+        return dbms
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """
+        Connection for one operation: the session connection,
+        or one taken from the pool.
+        """
+        if self.pool is None:
+            yield self.conn
+            return
+
+        async with self.pool.connection() as conn:
+            yield conn
+
+    async def load(self, collection=None):
+        """
+        Read the rows of a collection, or of all collections, once.
+        Referenced collections are read first.
+        """
+        collections = self.collections() if collection is None else [collection]
+
+        # Marked loaded before its rows are read: others wait
+        for coll in list(collections):
+            async with self.__loadLock:
+                if coll.isLoaded():
+                    continue
+
+                async with self.connection() as conn:
+                    await arun(conn.cursor(), self._loadSteps(coll))
+
+    async def items(self, collection = None, **refs):
+        if collection is None and refs:
+            # Only the collections that may match
+            async with self.connection() as conn:
+                collections = await arun(conn.cursor(), self._unloadedWith(refs))
+
+            for coll in collections:
+                await self.load(coll)
+        else:
+            await self.load(collection)
+
+        return self._found(collection, refs)
+
+    async def ensure(self, **refs):
+        matches = await self.items(**refs)
+
+        if matches:
+            return min(
+                matches,
+                key=lambda item: item.id()
+            )
+
+        return self.newItem(**refs)
+
+    async def commit(self):
+        """
+        Save the session in one transaction of its own connection.
+        """
+        async with self.__commitLock, self.connection() as conn:
+            await arun(conn.cursor(), self._commitSteps())
+
+    async def createIndexes(self):
+        """
+        Build the wanted table indexes concurrently, as
+        LZDB.createIndexes().
+        """
+        async with self.__commitLock, self.connection() as conn:
+            return await arun(conn.cursor(), self._indexSteps())
+
+    async def __resolveLinked(self, nodes):
+        """
+        Items of (collection number, id) pairs; collections
+        not loaded yet are read as a whole.
+        """
+        for coll, _ in self._unresolved(nodes):
+            await self.load(coll)
+
+        return self._resolved(nodes)
+
+    async def __linked(self, item, reltype, direction):
+        async with self.connection() as conn:
+            nodes = await arun(conn.cursor(), self._linkedNodes(item, reltype, direction))
+
+        resolved = await self.__resolveLinked(nodes)
+
+        return [
+            resolved[node] for node in nodes
+            if resolved.get(node) is not None
+        ]
+
+    async def linkedItems(self, item, reltype=None):
+        return await self.__linked(item, reltype, LZDB_DIR_OUTGOING)
+
+    async def incomingItems(self, item, reltype=None):
+        """
+        Items linking to item.
+        """
+        return await self.__linked(item, reltype, LZDB_DIR_INCOMING)
+
+    async def traverse(self, item, depth=1, reltype=None, direction=LZDB_DIR_OUTGOING):
+        """
+        Items reachable from item in at most depth hops, as
+        LZDB.traverse().
+        """
+        async with self.connection() as conn:
+            walk = await arun(conn.cursor(), self._walkSteps(item, depth, reltype, direction))
+
+        resolved = await self.__resolveLinked(
+            {node for _, _, path in walk for node in path[1:]}
+        )
+
+        return self._walked(item, walk, resolved)
+
+    async def linkGraph(self, reltype=None, collections=None):
+        """
+        lzdb_links as a LinkGraph, as LZDB.linkGraph().
+        """
+        async with self.connection() as conn:
+            return await arun(conn.cursor(), self._linkGraphSteps(reltype, collections))
+
+    async def iterItems(self, collection, batch_size=1000, raw=False):
+        """
+        Stream the rows of a collection table, as LZDB.iterItems(),
+        with async for.
+        """
+        if collection.id() is None:
+            return
+
+        if not collection.isLoaded():
+            async with self.connection() as conn:
+                await arun(conn.cursor(), collection.read_fkeys(collection.id()))
+
+        # References resolve to session items
+        for target in collection.foreignKeys().values():
+            await self.load(target)
+
+        name = f"lzdb_aiter_{next(AsyncLZDB.__cursors)}"
+
+        async with self.connection() as conn:
+            async with conn.cursor(name=name) as cur:
+                cur.itersize = batch_size
+                await cur.execute(f"select * from {collection.id()}")
+
+                fields = None
+
+                async for row in cur:
+                    if fields is None:
+                        fields = [desc[0] for desc in cur.description]
+
+                    pkitems = dict(zip(fields, row))
+
+                    yield pkitems if raw else self._streamed(collection, pkitems)
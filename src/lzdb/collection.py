@@ -1,5 +1,70 @@
+import datetime
+import decimal
+
+import numpy as np
+
 from .constants import *
 from .item import LZDBItem
+from .sqltypes import OIDS, TYPES, sqlType, widen
+from .index import MISSING, RANGES, HashIndex, SortedIndex, lookups, matches
+
+def parseDate(value):
+    """
+    Datetime of a 'YYYY-mm-dd HH:MM:SS' string, other values unchanged.
+    """
+    if (isinstance(value, str) and len(value) == 19
+            and value[4] == '-' and value[10] == ' ' and value[13] == ':'):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            pass
+
+    return value
+
+def parseDates(values):
+    """
+    parseDate over a whole column, with the same result value by
+    value. A column of dates only is parsed at once.
+    """
+    present = [value for value in values if value is not None]
+
+    if not present or not all(type(value) is str for value in present):
+        return [parseDate(value) for value in values]
+
+    # One extra character so that longer strings fail the shape check
+    chars = np.array(present, dtype="U20")
+    grid = chars.view("U1").reshape(len(chars), 20)
+
+    shaped = (
+        (np.char.str_len(chars) == 19)
+        & (grid[:, 4] == '-') & (grid[:, 10] == ' ') & (grid[:, 13] == ':')
+        & ((grid[:, :4] >= '0') & (grid[:, :4] <= '9')).all(axis=1)
+    )
+
+    if not shaped.any():
+        return values
+
+    try:
+        if not shaped.all():
+            raise ValueError
+        parsed = iter(chars.astype("datetime64[s]").astype(object).tolist())
+    except ValueError:
+        # Dates mixed with other strings: per value
+        return [parseDate(value) for value in values]
+
+    return [None if value is None else next(parsed) for value in values]
+
+def parseNumber(value):
+    """
+    int or float of a NUMERIC value, as it was stored.
+    """
+    if not isinstance(value, decimal.Decimal):
+        return value
+
+    if value == value.to_integral_value():
+        return int(value)
+
+    return float(value)
 
 class Collection(object):
     __id = None
@@ -8,11 +73,38 @@ class Collection(object):
     __fields = None
     __dbms = None
     __tname = ''
+    __loaded = False
+    __items = None
+    __ids = None
+    __indexes = None
+    __ordered = None
+    __filters = None
+    __columns = None
+    __queried = None
+    __wanted = None
+    __indexed = None
+
+    # Number of filters on a field before it gets indexed
+    indexThreshold = 2
+
+    # Number of database queries on a field before its column gets indexed
+    tableIndexThreshold = 3
 
     def __init__(self, dbms, ukeys=None, fkeys={}, dbitem=None, tname=''):
         self.__dbms = dbms
         self.__tname = tname
 
+        # Session items and their field indexes
+        self.__items = []
+        self.__ids = {}
+        self.__indexes = {}
+        self.__ordered = {}
+        self.__filters = {}
+
+        # Table indexes to create, by field
+        self.__queried = {}
+        self.__wanted = {}
+
         # Initialize fields
         self.__fields = []
         self.__fkeys = {}
@@ -21,7 +113,7 @@ class Collection(object):
         if ukeys is not None:
             self.__ukeys = sorted(ukeys)
             self.__fields.extend(self.__ukeys)
-            self.__fkeys = fkeys
+            self.__fkeys = dict(fkeys)
 
         # CASE 2: Collection created from dbitem (loading from DB)
         if dbitem is not None:
@@ -38,6 +130,207 @@ class Collection(object):
     def id(self):
         return self.__id
 
+    def number(self):
+        """
+        Numeric id of the table, as stored in lzdb and lzdb_links.
+        """
+        if self.__id is None:
+            return None
+        return int(self.__id.split('__')[1])
+
+    def markLoaded(self):
+        self.__loaded = True
+
+    def isLoaded(self):
+        """
+        True once the rows of the collection table have been read
+        (or scheduled to be read) into the session.
+        """
+        return self.__loaded
+
+    def foreignKeys(self):
+        return self.__fkeys
+
+    def addItem(self, dbitem):
+        self.__items.append(dbitem)
+
+        if dbitem.id() is not None:
+            self.__ids[dbitem.id()] = dbitem
+
+        if self.__indexes or self.__ordered:
+            for field in set(self.__indexes) | set(self.__ordered):
+                self.__update(field, dbitem, MISSING, dbitem.get(field, MISSING))
+
+        dbitem.attach()
+
+    def identify(self, dbitem, id):
+        """
+        Assign the row id of dbitem and record it in the
+        (collection, id) identity map.
+        """
+        previous = dbitem.id()
+        if previous is not None and previous != id and self.__ids.get(previous) is dbitem:
+            del self.__ids[previous]
+
+        dbitem.id(id)
+        self.__ids[id] = dbitem
+
+    def item(self, id):
+        """
+        Session item with the given row id, or None.
+        """
+        return self.__ids.get(id)
+
+    def itemChanged(self, dbitem, field=None, value=None):
+        """
+        Called by an attached item before field takes value,
+        or with no field when it was marked dirty or linked.
+        """
+        if field is not None:
+            self.__update(field, dbitem, dbitem.get(field, MISSING), value)
+
+        self.__dbms.markDirty(dbitem)
+
+    def __update(self, field, dbitem, old, new):
+        index = self.__indexes.get(field)
+
+        if index is not None:
+            index.remove(dbitem, old)
+            index.add(dbitem, new)
+
+        index = self.__ordered.get(field)
+
+        if index is not None:
+            try:
+                index.remove(dbitem, old)
+                index.add(dbitem, new)
+            except TypeError:
+                # Values of the field can no longer be ordered
+                del self.__ordered[field]
+
+    def createIndex(self, field, ordered=False):
+        """
+        Index field for equality lookups, or for range and
+        prefix lookups if ordered. Ordering mixed types raises TypeError.
+        """
+        indexes = self.__ordered if ordered else self.__indexes
+
+        if field not in indexes:
+            kind = SortedIndex if ordered else HashIndex
+            indexes[field] = kind(field, self.__items)
+
+        return indexes[field]
+
+    def index(self, field, ordered=False):
+        indexes = self.__ordered if ordered else self.__indexes
+        return indexes.get(field)
+
+    def items(self, **refs):
+        """
+        Session items of the collection matching refs.
+        The most selective field index is used when available;
+        fields filtered on repeatedly get indexed automatically.
+        """
+        if len(refs) == 0:
+            return self.__items
+
+        refs = lookups(refs)
+        conditions = {}
+
+        for field, lookup, value in refs:
+            conditions.setdefault(field, []).append((lookup, value))
+
+        best = None
+
+        for field, pairs in conditions.items():
+            plan = self.__plan(field, pairs)
+
+            if plan is None:
+                continue
+
+            if best is None or plan[0] < best[0]:
+                best = plan
+
+            if best[0] == 0:
+                return []
+
+        candidates = self.__items
+
+        if best is not None:
+            candidates = best[1]()
+
+        return [
+            item for item in candidates
+            if matches(item, refs)
+        ]
+
+    def __plan(self, field, pairs):
+        """
+        (count, fetch) of the cheapest index lookup for the
+        conditions on field, or None if the field must be scanned.
+        """
+        self.__filters[field] = self.__filters.get(field, 0) + 1
+        indexed = self.__filters[field] >= self.indexThreshold
+
+        best = None
+
+        for lookup, value in pairs:
+            if lookup not in ("exact", "in"):
+                continue
+
+            index = self.__indexes.get(field)
+
+            if index is None:
+                if not indexed:
+                    continue
+                index = self.createIndex(field)
+
+            values = [value] if lookup == "exact" else list(value)
+            counts = [index.count(v) for v in values]
+
+            if None in counts:
+                continue
+
+            if best is None or sum(counts) < best[0]:
+                best = (sum(counts), self.__fetchValues(index, values))
+
+        ranges = [
+            (lookup, value) for lookup, value in pairs
+            if lookup in RANGES or lookup == "startswith"
+        ]
+
+        if not ranges:
+            return best
+
+        index = self.__ordered.get(field)
+
+        try:
+            if index is None:
+                if not indexed:
+                    return best
+                index = self.createIndex(field, ordered=True)
+
+            lo, hi = index.bounds(ranges)
+        except TypeError:
+            return best
+
+        if best is None or hi - lo < best[0]:
+            best = (hi - lo, lambda: index.slice(lo, hi))
+
+        return best
+
+    def __fetchValues(self, index, values):
+        def fetch():
+            found = {}
+
+            for value in values:
+                for item in index.lookup(value):
+                    found[id(item)] = item
+
+            return found.values()
+
+        return fetch
+
     def name(self, tname=None):
         if tname is not None:
             self.__tname = tname
@@ -51,54 +344,128 @@ class Collection(object):
         """
         return self.__ukeys
 
-    def read(self, db, id):
+    def read(self, id):
+        """
+        Steps (see steps.py) loading all rows of the table into the
+        session. Rows already present in the session are skipped.
+        """
         self.__id = id
-        self.read_fkeys(db, id)
+        self.__loaded = True
+        yield from self.read_fkeys(id)
+
+        fields, rows = yield from self.fetch()
 
-        rows = db.execute("select * from %s" % id)
-        self.__fields = [desc[0] for desc in db.description]
+        self.readRows(fields, rows)
+
+    def readRows(self, fields, rows):
+        """
+        Load rows returned by fetch(). Referenced collections
+        must be loaded first.
+        """
+        self.__loaded = True
+        id = self.__id
 
         if self.__dbms.traceon:
             tname = f" as '{self.__tname}'" if self.__tname else ""
             if len(self.__fkeys) == 0:
-                print(f"Found {rows.rowcount} rows in {id}({','.join(self.__ukeys)}){tname}")
+                print(f"Found {len(rows)} rows in {id}({','.join(self.__ukeys)}){tname}")
             else:
-                print(f"Found {rows.rowcount} rows in {id}({','.join(self.__ukeys)}){tname} with references:")
+                print(f"Found {len(rows)} rows in {id}({','.join(self.__ukeys)}){tname} with references:")
                 for name, collection in self.__fkeys.items():
                     print(f"  {name} to {collection.id()}")
 
-        for row in rows:
-            pkitems = dict(zip(self.__fields, row))
-            items = {}
+        self.build(fields, rows)
+
+    def fetch(self):
+        """
+        Steps reading the column names and rows of the table,
+        with a binary COPY.
+        """
+        description = yield ("describe", f"select * from {self.__id} limit 0")
+        fields = [name for name, _ in description]
+        types = [oid for _, oid in description]
+
+        rows = yield ("copy_out", f"COPY {self.__id} TO STDOUT (FORMAT BINARY)", types, None)
 
-            for kk in self.__fields:
-                if kk in self.__fkeys:
-                    items[kk] = self.__dbms.items(collection=self.__fkeys[kk], id=pkitems[kk])
-                else:
-                    try:
-                        items[kk] = datetime.datetime.strptime(pkitems[kk], "%Y-%m-%d %H:%M:%S")
-                    except:
-                        items[kk] = pkitems[kk]
+        self.__fields = fields
+        self.__columns = {
+            field: OIDS.get(oid)
+            for field, oid in zip(fields, types)
+        }
 
-            obj = {}
+        return fields, rows
 
-            for field in (self.__ukeys or []):
-                obj[field] = items[field]
+    def build(self, fields, rows):
+        """
+        Register the fetched rows as loaded items.
+        """
+        dbms = self.__dbms
+        pos = fields.index('id')
+
+        rows = [row for row in rows if row[pos] not in self.__ids]
+
+        if not rows:
+            return
+
+        # Converted column by column, then rebuilt into rows
+        columns = [list(column) for column in zip(*rows)]
+
+        # References to this collection may point at rows of the batch
+        inner = [
+            field for field in fields
+            if self.__fkeys.get(field) is self
+        ]
+
+        for i, field in enumerate(fields):
+            if field in inner:
+                continue
+
+            if field in self.__fkeys:
+                item = self.__fkeys[field].item
+                columns[i] = [item(value) for value in columns[i]]
+
+            # Typed columns come back typed; only text may hold dates
+            elif self.__columns.get(field) in ("VARCHAR", None):
+                columns[i] = parseDates(columns[i])
 
-            for field in self.__fkeys:
-                obj[field] = items[field]
+            elif self.__columns.get(field) == "NUMERIC":
+                columns[i] = [parseNumber(value) for value in columns[i]]
 
-            dbitem = self.__dbms.newItem(collection=self, __loading = True, **obj)
-            dbitem.id(items['id'])
-            dbitem.markLoaded()
+        loaded = [
+            dbms.loadItem(self, dict(zip(fields, row)))
+            for row in zip(*columns)
+        ]
 
-            for field in items:
-                if field not in (self.__ukeys or []):
-                    dbitem[field] = items[field]
-                    dbitem.markLoaded()
-                    dbitem.clearDirty()
+        # Resolved once all the rows are registered
+        for field in inner:
+            for dbitem in loaded:
+                value = dbitem[field]
 
-    def read_fkeys(self, db, id):
+                if value is not None:
+                    target = self.item(value)
+                    dict.__setitem__(dbitem, field, target)
+                    self.__update(field, dbitem, value, target)
+
+    def convert(self, pkitems):
+        """
+        Field values of a row: references resolved to items,
+        dates parsed out of text columns.
+        """
+        items = {}
+
+        for kk in pkitems:
+            if kk in self.__fkeys:
+                items[kk] = self.__fkeys[kk].item(pkitems[kk])
+            elif self.columnType(kk) in ("VARCHAR", None):
+                items[kk] = parseDate(pkitems[kk])
+            elif self.columnType(kk) == "NUMERIC":
+                items[kk] = parseNumber(pkitems[kk])
+            else:
+                items[kk] = pkitems[kk]
+
+        return items
+
+    def read_fkeys(self, id):
         s = """SELECT 
                 kcu.column_name, 
                 ccu.table_name AS foreign_table_name 
@@ -112,49 +479,224 @@ class Collection(object):
                   AND ccu.table_schema = tc.table_schema
             WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name='%s';""" % id
 
-        db.execute(s)
-        items = db.fetchall()
-        self.__fkeys = {}
+        items = yield ("execute", s, None)
+        fkeys = {}
 
         for field, collid in dict(items).items():
             coll = self.__dbms.collections(id=collid)
-            self.__fkeys[field] = coll
+            fkeys[field] = coll
+            self.wantIndex(field, "foreign key")
 
-    def createNewFields(self, db, dbitem):
-        # Get existing columns
-        db.execute(f"""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = '{self.__id}'
-        """)
-        existing = {row[0] for row in db.fetchall()}
+        # Replaced at once, as other threads may be reading them
+        self.__fkeys = fkeys
 
-        newFields = []
+    def columns(self):
+        """
+        Steps returning the column types of the table by name,
+        read from the catalog only if not known yet.
+        """
+        if self.__columns is None:
+            rows = yield ("execute", f"""
+                SELECT column_name, udt_name
+                FROM information_schema.columns
+                WHERE table_name = '{self.__id}'
+            """, None)
+            self.catalogColumns(rows)
 
-        for field in dbitem.fields():
-            if field in existing:
-                continue
+        return self.__columns
 
-            value = dbitem.get(field)
+    def catalogColumns(self, rows):
+        """
+        Record the columns of the table from (column_name, udt_name)
+        rows of the catalog.
+        """
+        self.__columns = {
+            row[0]: TYPES.get(row[1])
+            for row in rows
+        }
+
+    def knownColumns(self):
+        """
+        Column types by name, None if not read yet.
+        """
+        return self.__columns
+
+    def columnType(self, field):
+        if self.__columns is None:
+            return None
+        return self.__columns.get(field)
 
-            # TRUE foreign key: value is another lzdbItem
-            if isinstance(value, LZDBItem):
-                db.execute(
-                    f"ALTER TABLE {self.__id} "
-                    f"ADD COLUMN {field} INTEGER REFERENCES {value.collection().id()}"
-                )
+    def queried(self, fields):
+        """
+        Count database queries filtering on fields; a field
+        queried often enough gets its column indexed.
+        """
+        for field in fields:
+            if self.__columns is None or field not in self.__columns:
                 continue
 
-            # Normal field → VARCHAR
-            newFields.append(field)
+            self.__queried[field] = self.__queried.get(field, 0) + 1
+
+            if self.__queried[field] >= self.tableIndexThreshold:
+                self.wantIndex(field, "filter")
+
+    def wantIndex(self, field, reason, fresh=False):
+        """
+        Request an index on the column of field, created by the
+        next createIndexes() unless the column has one. fresh columns
+        were added by a commit and are indexed in its transaction.
+        """
+        if self.__indexed is not None and field in self.__indexed:
+            return
+
+        if fresh or field not in self.__wanted:
+            self.__wanted[field] = (reason, fresh)
+
+    def tableIndexes(self):
+        """
+        Steps returning the columns leading a valid index of the
+        table, read from the catalog only if not known yet.
+        """
+        if self.__indexed is None:
+            rows = yield ("execute", """
+                SELECT a.attname
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indrelid
+                JOIN pg_attribute a
+                  ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+                WHERE c.relname = %s AND i.indisvalid
+            """, (self.__id,))
+            self.__indexed = {row[0] for row in rows}
+
+        return self.__indexed
+
+    def wantedIndexes(self):
+        """
+        Steps returning the indexes to create, as a dict
+        field -> (reason, fresh).
+        """
+        if not self.__wanted or self.__id is None:
+            return {}
+
+        indexed = yield from self.tableIndexes()
+
+        for field in list(self.__wanted):
+            if field in indexed:
+                del self.__wanted[field]
 
-        # Add normal fields
-        for field in newFields:
-            db.execute(f"ALTER TABLE {self.__id} ADD COLUMN {field} VARCHAR")
+        return dict(self.__wanted)
 
-        self.__fields.extend(newFields)
+    def indexCreated(self, field, created=True):
+        """
+        Record the outcome of the creation of a wanted index;
+        a failed one is not attempted again.
+        """
+        self.__wanted.pop(field, None)
+
+        if created and self.__indexed is not None:
+            self.__indexed.add(field)
+
+    def rolledBack(self, created=False):
+        """
+        Forget what a failed commit did to the table: its columns
+        and indexes are read again from the catalog, and a table
+        created by the commit is created by the next one.
+        """
+        self.__columns = None
+        self.__indexed = None
+
+        self.__wanted = {
+            field: wanted
+            for field, wanted in self.__wanted.items()
+            if not wanted[1]
+        }
+
+        if created:
+            self.__id = None
+
+    def createNewFields(self, dbitems):
+        """
+        Steps adding the columns missing for dbitems, typed after their
+        values, and widening existing columns the new values do not fit
+        in. Everything is done in one ALTER TABLE.
+        """
+        existing = yield from self.columns()
+
+        newFields = {}
+        references = {}
+        widened = {}
+
+        for dbitem in dbitems:
+            for field in dbitem.changedFields():
+                if field == "id" or field not in dbitem:
+                    continue
+
+                value = dbitem[field]
+
+                if field in existing:
+                    current = existing[field]
+
+                    # Reference and unknown columns are left alone
+                    if field in self.__fkeys or current is None:
+                        continue
+
+                    sqltype = widen(widened.get(field, current), sqlType(value))
+
+                    if sqltype != current:
+                        widened[field] = sqltype
+
+                    continue
+
+                if field in references:
+                    continue
+
+                # TRUE foreign key: value is another lzdbItem
+                if isinstance(value, LZDBItem):
+                    references[field] = value.collection()
+                    newFields.pop(field, None)
+                    continue
 
-    def createTable(self, db):
+                newFields[field] = widen(newFields.get(field), sqlType(value))
+
+        if not newFields and not references and not widened:
+            return
+
+        columns = [
+            f"ADD COLUMN IF NOT EXISTS {field} {sqltype or 'VARCHAR'}"
+            for field, sqltype in newFields.items()
+        ]
+
+        columns.extend(
+            f"ADD COLUMN IF NOT EXISTS {field} INTEGER REFERENCES {collection.id()}"
+            for field, collection in references.items()
+        )
+
+        columns.extend(
+            f"ALTER COLUMN {field} TYPE {sqltype} USING {field}::{sqltype}"
+            for field, sqltype in widened.items()
+        )
+
+        yield ("execute", f"ALTER TABLE {self.__id} {', '.join(columns)}", None)
+
+        for field, sqltype in newFields.items():
+            existing[field] = sqltype or "VARCHAR"
+
+        for field, collection in references.items():
+            existing[field] = "INTEGER"
+            self.__fkeys[field] = collection
+            self.wantIndex(field, "foreign key", fresh=True)
+
+        existing.update(widened)
+
+        self.__fields.extend(
+            field for field in list(newFields) + list(references)
+            if field not in self.__fields
+        )
+
+    def createTable(self):
+        """
+        Steps registering the collection and creating its table.
+        """
         if self.__id is not None:
             return
 
@@ -162,7 +704,8 @@ class Collection(object):
         ukeys = ",".join(self.uniqueKeys() or [])
         tname = self.name() if hasattr(self, "name") else ""
 
-        db.execute(
+        rows = yield (
+            "execute",
             """
             INSERT INTO lzdb(ukeys, tname)
             VALUES (%s, %s)
@@ -172,8 +715,7 @@ class Collection(object):
             """,
             (ukeys, tname),
         )
-        res = db.fetchone()
-        self.__id = f"lzdb__{res[0]}"
+        self.__id = f"lzdb__{rows[0][0]}"
 
         # Build CREATE TABLE statement for the actual collection table
         s = f"CREATE TABLE IF NOT EXISTS {self.__id}(id SERIAL PRIMARY KEY"
@@ -182,15 +724,35 @@ class Collection(object):
         for k, collection in self.__fkeys.items():
             fk = f"{k} INTEGER REFERENCES {collection.id()}"
             s += f", {fk}"
+            self.wantIndex(k, "foreign key", fresh=True)
 
+        # Data columns typed after the values of the new items
         fields = self.uniqueKeys() or []
-        data_fields = [f"{x} VARCHAR" for x in fields if x not in self.__fkeys]
+        types = {}
+
+        for dbitem in self.__items:
+            if dbitem.isLoaded():
+                continue
+            for x in fields:
+                types[x] = widen(types.get(x), sqlType(dbitem.get(x)))
+
+        data_fields = [
+            f"{x} {types.get(x) or 'VARCHAR'}"
+            for x in fields if x not in self.__fkeys
+        ]
         if data_fields:
             s += ", " + ", ".join(data_fields)
 
         # Close CREATE TABLE
         s += ");"
 
-        db.execute(s)
+        yield ("execute", s, None)
+
+        self.__columns = {"id": "INTEGER"}
+        self.__columns.update((k, "INTEGER") for k in self.__fkeys)
+        self.__columns.update(
+            (x, types.get(x) or "VARCHAR")
+            for x in fields if x not in self.__fkeys
+        )
 
 
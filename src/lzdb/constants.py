@@ -1,3 +1,7 @@
 LZDB_REL_DIRECTED = 0
 LZDB_REL_UNDIRECTED = 1
 
+
+LZDB_DIR_OUTGOING = "out"
+LZDB_DIR_INCOMING = "in"
+LZDB_DIR_BOTH = "both"
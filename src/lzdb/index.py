@@ -0,0 +1,259 @@
+################################################################################
+#
+#  Copyright (C) 2019 Fabien Bouleau
+#
+#  This file is part of lzdb.
+#
+# lzdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lzdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with lzdb. If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+import bisect
+
+from .item import LZDBItem
+
+MISSING = object()
+
+# Django-style lookups: items(starttime__gte=..., param__in=[...])
+LOOKUPS = ("exact", "in", "isnull", "gt", "gte", "lt", "lte", "startswith")
+RANGES = ("gt", "gte", "lt", "lte")
+
+def indexKey(value):
+    """
+    Hashable key of a field value, or None if the value
+    cannot be indexed (lists, dicts...).
+    References are keyed by identity.
+    """
+    if isinstance(value, LZDBItem):
+        return (LZDBItem, id(value))
+
+    try:
+        hash(value)
+    except TypeError:
+        return None
+
+    return value
+
+def lookups(refs):
+    """
+    Split refs into (field, lookup, value) triples.
+    """
+    result = []
+
+    for name, value in refs.items():
+        field, sep, lookup = name.rpartition("__")
+
+        if not sep or not field or lookup not in LOOKUPS:
+            field, lookup = name, "exact"
+
+        result.append((field, lookup, value))
+
+    return result
+
+def compare(current, lookup, value):
+    if lookup == "exact":
+        if isinstance(value, LZDBItem) or isinstance(current, LZDBItem):
+            return current is value
+        return current is value or current == value
+
+    if lookup == "in":
+        return any(compare(current, "exact", v) for v in value)
+
+    if lookup == "isnull":
+        return (current is None) == bool(value)
+
+    if current is None:
+        return False
+
+    try:
+        if lookup == "gt":
+            return current > value
+        if lookup == "gte":
+            return current >= value
+        if lookup == "lt":
+            return current < value
+        if lookup == "lte":
+            return current <= value
+        if lookup == "startswith":
+            return isinstance(current, str) and current.startswith(value)
+    except TypeError:
+        return False
+
+    return False
+
+def matches(item, refs):
+    """
+    True if item satisfies all the lookups of refs (as returned
+    by lookups()). References compare by identity, as in the indexes.
+    """
+    for field, lookup, value in refs:
+        current = item.get(field, MISSING)
+
+        if current is MISSING:
+            if lookup != "isnull":
+                return False
+            current = None
+
+        if not compare(current, lookup, value):
+            return False
+
+    return True
+
+class HashIndex(object):
+    """
+    Inverted index field value -> items of one collection.
+    """
+    def __init__(self, field, items=()):
+        self.__field = field
+        self.__buckets = {}
+
+        for item in items:
+            self.add(item, item.get(field, MISSING))
+
+    def field(self):
+        return self.__field
+
+    def add(self, item, value):
+        if value is MISSING:
+            return
+
+        key = indexKey(value)
+
+        if key is None:
+            return
+
+        self.__buckets.setdefault(key, {})[id(item)] = item
+
+    def remove(self, item, value):
+        if value is MISSING:
+            return
+
+        key = indexKey(value)
+
+        if key is None:
+            return
+
+        bucket = self.__buckets.get(key)
+
+        if bucket is None:
+            return
+
+        bucket.pop(id(item), None)
+
+        if not bucket:
+            del self.__buckets[key]
+
+    def lookup(self, value):
+        """
+        Items whose field equals value, or None if the
+        value cannot be looked up through the index.
+        """
+        key = indexKey(value)
+
+        if key is None:
+            return None
+
+        return list(self.__buckets.get(key, {}).values())
+
+    def count(self, value):
+        key = indexKey(value)
+
+        if key is None:
+            return None
+
+        return len(self.__buckets.get(key, ()))
+
+class SortedIndex(object):
+    """
+    Ordered index field value -> items of one collection,
+    for range and prefix lookups. Raises TypeError when
+    the values of the field cannot be ordered.
+    """
+    def __init__(self, field, items=()):
+        self.__field = field
+
+        pairs = []
+
+        for item in items:
+            value = item.get(field, MISSING)
+
+            if self.__sortable(value):
+                pairs.append((value, item))
+
+        pairs.sort(key=lambda pair: pair[0])
+
+        self.__keys = [pair[0] for pair in pairs]
+        self.__items = [pair[1] for pair in pairs]
+
+    def __sortable(self, value):
+        if value is MISSING or value is None:
+            return False
+
+        return indexKey(value) is not None and not isinstance(value, LZDBItem)
+
+    def field(self):
+        return self.__field
+
+    def add(self, item, value):
+        if not self.__sortable(value):
+            return
+
+        i = bisect.bisect_right(self.__keys, value)
+        self.__keys.insert(i, value)
+        self.__items.insert(i, item)
+
+    def remove(self, item, value):
+        if not self.__sortable(value):
+            return
+
+        lo = bisect.bisect_left(self.__keys, value)
+        hi = bisect.bisect_right(self.__keys, value)
+
+        for i in range(lo, hi):
+            if self.__items[i] is item:
+                del self.__keys[i]
+                del self.__items[i]
+                return
+
+    def bounds(self, ranges):
+        """
+        Slice (lo, hi) of the items satisfying all the
+        (lookup, value) pairs of ranges.
+        """
+        lo = 0
+        hi = len(self.__keys)
+
+        for lookup, value in ranges:
+            if lookup == "gt":
+                lo = max(lo, bisect.bisect_right(self.__keys, value))
+            elif lookup == "gte":
+                lo = max(lo, bisect.bisect_left(self.__keys, value))
+            elif lookup == "lt":
+                hi = min(hi, bisect.bisect_left(self.__keys, value))
+            elif lookup == "lte":
+                hi = min(hi, bisect.bisect_right(self.__keys, value))
+            elif lookup == "startswith":
+                start = bisect.bisect_left(self.__keys, value)
+                end = start
+
+                while end < len(self.__keys) and self.__keys[end].startswith(value):
+                    end += 1
+
+                lo = max(lo, start)
+                hi = min(hi, end)
+
+        return lo, max(lo, hi)
+
+    def slice(self, lo, hi):
+        return self.__items[lo:hi]
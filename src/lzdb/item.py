@@ -1,5 +1,30 @@
 from .constants import *
 
+def signature(fields):
+    """
+    Virtual PK of a field dict, as a sorted tuple of field names.
+    """
+    keys = []
+    for k, v in fields.items():
+        if k == "id":
+            continue
+        if k.startswith("refers"):
+            continue
+        if isinstance(v, list):
+            continue
+        keys.append(k)
+    return tuple(sorted(keys))
+
+def references(fields):
+    """
+    Collections referenced by the LZDBItem values of a field dict.
+    """
+    return {
+        field: value.collection()
+        for field, value in fields.items()
+        if isinstance(value, LZDBItem)
+    }
+
 class LZDBItem(dict):
     def __init__(self, collection, **kwargs):
         super().__init__()
@@ -8,33 +33,80 @@ class LZDBItem(dict):
         self.__id = None
         self.__loaded = False
         self.__dirty = True
+        self.__changed = set()
+        self.__attached = False
 
         self.__links = []
+        self.__pending = []
 
         for k, v in kwargs.items():
             self[k] = v
 
+    @classmethod
+    def fromRow(cls, collection, id, fields):
+        """
+        Build a loaded, clean item from a row without going
+        through __setitem__. The item is not attached yet.
+        """
+        dbitem = cls.__new__(cls)
+        dict.__init__(dbitem, fields)
+
+        dbitem.__collection = collection
+        dbitem.__id = id
+        dbitem.__loaded = True
+        dbitem.__dirty = False
+        dbitem.__changed = set()
+        dbitem.__attached = False
+
+        dbitem.__links = []
+        dbitem.__pending = []
+
+        return dbitem
+
     def __setitem__(self, key, value):
+        if self.__attached:
+            self.__collection.itemChanged(self, key, value)
+
         super().__setitem__(key, value)
         self.__dirty = True
+        self.__changed.add(key)
+
+    def attach(self):
+        """
+        Called once the item is registered in its collection.
+        From then on, changes keep the collection indexes in sync
+        and are reported to the dbms for the next commit.
+        """
+        self.__attached = True
+
+    def isAttached(self):
+        return self.__attached
 
     def markDirty(self):
+        """
+        Mark every field as changed.
+        """
         self.__dirty = True
+        self.__changed.update(self.keys())
+
+        if self.__attached:
+            self.__collection.itemChanged(self)
 
     def clearDirty(self):
         self.__dirty = False
+        self.__changed.clear()
 
     def isDirty(self):
         return self.__dirty
 
-    def foreignKeys(self):
-        result = {}
-
-        for field, value in self.items():
-            if isinstance(value, LZDBItem):
-                result[field] = value.collection()
+    def changedFields(self):
+        """
+        Fields set since the item was last saved or loaded.
+        """
+        return sorted(self.__changed)
 
-        return result
+    def foreignKeys(self):
+        return references(self)
 
     def markLoaded(self):
         self.__loaded = True
@@ -57,14 +129,29 @@ class LZDBItem(dict):
 
             return
 
-        self.__links.append({
+        link = {
             "item": item,
             "reltype": reltype
-        })
+        }
+
+        self.__links.append(link)
+        self.__pending.append(link)
+
+        if self.__attached:
+            self.__collection.itemChanged(self)
 
     def links(self):
         return self.__links
 
+    def pendingLinks(self):
+        """
+        Links not stored in lzdb_links yet.
+        """
+        return list(self.__pending)
+
+    def clearPendingLinks(self, keep=()):
+        self.__pending = list(keep)
+
     def set(self, **kwargs):
         """
         Update fields of the item (original lzdb behavior).
@@ -93,15 +180,6 @@ class LZDBItem(dict):
         These fields determine the table schema,
         NOT uniqueness constraints.
         """
-        keys = []
-        for k, v in self.items():
-            if k == "id":
-                continue
-            if k.startswith("refers"):
-                continue
-            if isinstance(v, list):
-                continue
-            keys.append(k)
-        return sorted(keys)
+        return list(signature(self))
 
 
@@ -0,0 +1,226 @@
+################################################################################
+#
+#  Copyright (C) 2019 Fabien Bouleau
+#
+#  This file is part of lzdb.
+#
+# lzdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lzdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with lzdb. If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+import numpy as np
+
+# Columns of a link row
+SRC_COLLECTION, SRC_ID, DST_COLLECTION, DST_ID, RELTYPE = range(5)
+
+def readLinks(where="true", params=()):
+    """
+    Steps returning the rows of lzdb_links, as an (n, 5) integer
+    array; none before the table is created.
+    """
+    rows = yield ("execute", "select to_regclass('lzdb_links') is not null", None)
+
+    if not rows[0][0]:
+        return np.empty((0, 5), dtype=np.int32)
+
+    rows = yield ("copy_out", f"""
+        copy (
+            select
+                src_collection,
+                src_id,
+                dst_collection,
+                dst_id,
+                reltype
+            from
+                lzdb_links
+            where
+                {where}
+        ) to stdout (format binary)
+    """, ["int4", "int4", "int4", "int4", "int2"], params)
+
+    return np.array(rows, dtype=np.int32).reshape(-1, 5)
+
+class Adjacency(object):
+    """
+    Links of one side, grouped by the collection of that side:
+    for each collection, the ids of that side sorted, with the
+    collection, id and reltype of the other side in parallel arrays.
+    """
+    def __init__(self, links, near, far):
+        self.__groups = {}
+
+        if len(links) == 0:
+            return
+
+        order = np.lexsort((links[:, near + 1], links[:, near]))
+        links = links[order]
+
+        numbers, starts = np.unique(links[:, near], return_index=True)
+        ends = list(starts[1:]) + [len(links)]
+
+        for number, start, end in zip(numbers, starts, ends):
+            group = links[start:end]
+
+            self.__groups[int(number)] = (
+                group[:, near + 1].astype(np.int32),
+                group[:, far].astype(np.int32),
+                group[:, far + 1].astype(np.int32),
+                group[:, RELTYPE].astype(np.int16),
+            )
+
+    def lookup(self, number, ids, reltype=None):
+        """
+        Other sides of the links of the given ids of a collection, as
+        one list of (collection, id) pairs per id.
+        """
+        group = self.__groups.get(number)
+
+        if group is None:
+            return [[] for _ in ids]
+
+        keys, collections, others, reltypes = group
+
+        ids = np.asarray(ids, dtype=np.int32)
+        los = np.searchsorted(keys, ids, side="left")
+        his = np.searchsorted(keys, ids, side="right")
+
+        result = []
+
+        for lo, hi in zip(los, his):
+            pairs = zip(collections[lo:hi].tolist(), others[lo:hi].tolist())
+
+            if reltype is None:
+                result.append(list(pairs))
+            else:
+                kinds = reltypes[lo:hi].tolist()
+                result.append([pair for pair, kind in zip(pairs, kinds) if kind == reltype])
+
+        return result
+
+class LinkCache(object):
+    """
+    In-memory copy of lzdb_links, read once, answering outgoing and
+    incoming neighbour lookups without round trips. Links written
+    by commit are added and merged in on the next lookup.
+    """
+    def __init__(self):
+        self.__links = None
+        self.__added = []
+        self.__outgoing = None
+        self.__incoming = None
+
+    def isLoaded(self):
+        return self.__links is not None
+
+    def load(self, links):
+        """
+        Start from the rows of lzdb_links, as read by readLinks().
+        """
+        self.__links = links
+
+        self.__index()
+
+    def add(self, rows):
+        """
+        Record link rows stored by a commit.
+        """
+        self.__added.extend(rows)
+
+    def __index(self):
+        if self.__added:
+            added = np.array(self.__added, dtype=np.int32).reshape(-1, 5)
+            self.__links = np.unique(np.concatenate([self.__links, added]), axis=0)
+            self.__added = []
+
+        self.__outgoing = Adjacency(self.__links, SRC_COLLECTION, DST_COLLECTION)
+        self.__incoming = Adjacency(self.__links, DST_COLLECTION, SRC_COLLECTION)
+
+    def outgoing(self, number, ids, reltype=None):
+        if self.__added:
+            self.__index()
+        return self.__outgoing.lookup(number, ids, reltype)
+
+    def incoming(self, number, ids, reltype=None):
+        if self.__added:
+            self.__index()
+        return self.__incoming.lookup(number, ids, reltype)
+
+    def size(self):
+        """
+        Number of links held.
+        """
+        return len(self.__links) + len(self.__added)
+
+class LinkGraph(object):
+    """
+    Links as a graph in compressed sparse row form: the neighbours
+    of node n are indices[indptr[n]:indptr[n + 1]], and node n is
+    the item (collections[n], ids[n]).
+    """
+    def __init__(self, links):
+        src = (links[:, SRC_COLLECTION].astype(np.int64) << 32) | links[:, SRC_ID]
+        dst = (links[:, DST_COLLECTION].astype(np.int64) << 32) | links[:, DST_ID]
+
+        self.__nodes = np.unique(np.concatenate([src, dst]))
+
+        rows = np.searchsorted(self.__nodes, src)
+        cols = np.searchsorted(self.__nodes, dst)
+
+        # One entry per pair of nodes, whatever the reltypes
+        pairs = np.unique(np.stack([rows, cols], axis=1), axis=0)
+
+        self.indices = pairs[:, 1].astype(np.int32)
+        self.indptr = np.zeros(len(self.__nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=len(self.__nodes)), out=self.indptr[1:])
+
+        self.collections = (self.__nodes >> 32).astype(np.int32)
+        self.ids = (self.__nodes & 0xFFFFFFFF).astype(np.int32)
+
+    def size(self):
+        """
+        Number of nodes.
+        """
+        return len(self.__nodes)
+
+    def node(self, n):
+        """
+        (collection number, id) of node n.
+        """
+        return int(self.collections[n]), int(self.ids[n])
+
+    def index(self, item):
+        """
+        Node of an item, or None if it has no link.
+        """
+        if item.id() is None:
+            return None
+
+        key = (item.collection().number() << 32) | item.id()
+        n = np.searchsorted(self.__nodes, key)
+
+        if n < len(self.__nodes) and self.__nodes[n] == key:
+            return int(n)
+
+        return None
+
+    def matrix(self):
+        """
+        Adjacency as a scipy.sparse CSR matrix (scipy is needed).
+        """
+        from scipy.sparse import csr_matrix
+
+        n = len(self.__nodes)
+        data = np.ones(len(self.indices), dtype=np.int8)
+
+        return csr_matrix((data, self.indices, self.indptr), shape=(n, n))
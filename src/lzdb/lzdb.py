@@ -19,48 +19,145 @@
 #
 ################################################################################
 
+import concurrent.futures
+import contextlib
 import datetime
+import numpy as np
 import pandas as pd
+import psycopg as pg
 import pprint
+import queue
 import getpass
+import itertools
+import threading
 
 from .constants import *
-from .item import LZDBItem
+from .item import LZDBItem, signature, references
 from .collection import Collection
+from .index import lookups
+from .sqltypes import adapt
+from .query import Query
+from .links import LinkCache, LinkGraph, readLinks
+from .steps import run
 from .lzdict import lzdict
 
 ACCOUNT_NAME = getpass.getuser()
 
 class LZDB(object):
-    __db = None
+    __conn = None
+    __pool = None
+    __local = None
+    __lock = None
     __collections = None
     __items = None
+    __signatures = None
+    __tables = None
+    __names = None
+    __keys = None
+    __dirty = None
+    __ddl = None
+    __lazy = False
+    __cursors = itertools.count(1)
+    __indexLog = None
+    __linkCache = None
+    __systemIndexes = False
+    __undirectedOnce = False
+    __loadWorkers = 1
     traceon = False
 
-    def __init__(self, conn, traceon = False):
+    # Longest wait of a concurrent index build for other transactions
+    indexLockTimeout = "2s"
+
+    def __init__(self, conn, traceon = False, lazy = False, linkcache = False,
+                 undirected_once = False, load_workers = 1):
         import inspect
 
-        self.__conn = conn
-        self.__db = conn.cursor()
+        # conn is a connection, or a pool (psycopg_pool.ConnectionPool)
+        # from which a connection is taken per operation
+        if isinstance(conn, (pg.Connection, pg.AsyncConnection)):
+            self.__conn = conn
+        else:
+            self.__pool = conn
+
+        self.__local = threading.local()
+
+        # Held while the session is changed: loads, merges, commits
+        self.__lock = threading.RLock()
+
         self.__collections = []
         self.__items = []
+
+        # Collection registry: by signature, table id and name
+        self.__signatures = {}
+        self.__tables = {}
+        self.__names = {}
+        self.__keys = {}
+
+        # Items and collections to visit on the next commit
+        self.__dirty = {}
+        self.__ddl = []
+
+        # Table indexes created by this session
+        self.__indexLog = []
+
+        # In-memory lzdb_links, read on first use
+        if linkcache:
+            self.__linkCache = LinkCache()
+
+        # Undirected links stored as a single row
+        self.__undirectedOnce = undirected_once
+
+        # Threads (and connections) fetching the tables at startup
+        self.__loadWorkers = load_workers
+
+        self.__lazy = lazy
         LZDB.traceon = traceon
 
-        db = conn.cursor()
-        db.execute(
-            "select exists(select 1 from information_schema.tables where table_schema='public' and table_name='lzdb')")
-        if not db.fetchone()[0]:
-            db.execute("""
+        self._start()
+
+    def _start(self):
+        if self.__loadWorkers < 2 or self.__lazy:
+            with self.connection() as conn:
+                run(conn.cursor(), self._startSteps())
+            return
+
+        with self.connection() as conn:
+            idle = conn.info.transaction_status == pg.pq.TransactionStatus.IDLE
+
+            # The loading threads read the snapshot of this
+            # transaction, as pg_dump -j does
+            with conn.transaction():
+                db = conn.cursor()
+
+                if idle:
+                    db.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+                db.execute("SELECT pg_export_snapshot()")
+                snapshot = db.fetchone()[0]
+
+                run(db, self._startSteps(load=False))
+                sizes = run(db, self.__tableSizes())
+
+                self.__loadParallel(sizes, snapshot)
+
+    def _startSteps(self, load=True):
+        """
+        Steps (see steps.py) reading the inventory, and the
+        references and rows unless lazy or not load.
+        """
+        rows = yield ("execute",
+            "select exists(select 1 from information_schema.tables where table_schema='public' and table_name='lzdb')", None)
+        if not rows[0][0]:
+            yield ("execute", """
                 CREATE TABLE IF NOT EXISTS lzdb (
                     id SERIAL PRIMARY KEY,
                     ukeys TEXT UNIQUE,
                     tname TEXT
                 );
-            """)
+            """, None)
 
 
-        db.execute("select id, ukeys, tname from lzdb")
-        tables = db.fetchall()
+        tables = yield ("execute", "select id, ukeys, tname from lzdb", None)
 
         # Pass 1: create all collections
         for table in tables:
@@ -75,27 +172,266 @@ class LZDB(object):
 
             collection._Collection__id = f"lzdb__{table[0]}"
 
-            self.__collections.append(collection)
+            self.__register(collection)
+
+        # Lazy mode: rows are read on first access (see __load)
+        if self.__lazy or not load:
+            return
 
         # Pass 2: resolve FKs and load rows
         for collection in self.__collections:
 
-            collection.read_fkeys(
-                db,
+            yield from collection.read_fkeys(
                 collection.id()
             )
 
         for collection in self.__collections:
 
-            collection.read(
-                db,
-                collection.id()
-            )
+            yield from self._loadSteps(collection)
+
+    def __tableSizes(self):
+        """
+        Steps returning the estimated number of rows of the
+        collection tables, by table.
+        """
+        rows = yield ("execute",
+            "select relname, reltuples from pg_class where relname = any(%s)",
+            ([collection.id() for collection in self.__collections],)
+        )
+
+        return dict(rows)
+
+    def __loadParallel(self, sizes, snapshot):
+        """
+        Read the references and rows of the collection tables on
+        load_workers connections at once, the biggest first, all in
+        the exported snapshot, then load the rows in reference order,
+        referenced collections first.
+        """
+        pending = queue.Queue()
+
+        for collection in sorted(self.__collections, key=lambda c: -sizes.get(c.id(), 0)):
+            pending.put(collection)
+
+        fetched = {}
+
+        def work():
+            with self.__workerConnection() as conn, conn.transaction():
+                db = conn.cursor()
+                db.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                db.execute(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+
+                while True:
+                    try:
+                        collection = pending.get_nowait()
+                    except queue.Empty:
+                        return
+
+                    run(db, collection.read_fkeys(collection.id()))
+                    fetched[collection] = run(db, collection.fetch())
+
+        with concurrent.futures.ThreadPoolExecutor(self.__loadWorkers) as executor:
+            for future in [executor.submit(work) for _ in range(self.__loadWorkers)]:
+                future.result()
+
+        done = set()
+
+        def visit(collection):
+            if collection in done:
+                return
+
+            done.add(collection)
+
+            for target in collection.foreignKeys().values():
+                visit(target)
+
+            collection.readRows(*fetched[collection])
+
+        for collection in self.__collections:
+            visit(collection)
+
+    @contextlib.contextmanager
+    def __workerConnection(self):
+        """
+        Connection of a loading thread: from the pool, or a new
+        connection to the database of the session.
+        """
+        if self.__pool is not None:
+            with self.connection() as conn:
+                yield conn
+            return
+
+        info = self.__conn.info
+
+        with pg.connect(info.dsn, password=info.password or None) as conn:
+            yield conn
+
+    def __register(self, collection):
+        self.__collections.append(collection)
+        self.__signatures[tuple(collection.uniqueKeys())] = collection
+
+        if collection.id() is not None:
+            self.__tables[collection.id()] = collection
+        else:
+            self.__ddl.append(collection)
+
+        self.__names.setdefault(collection.name(), collection)
+
+    def __signature(self, refs):
+        """
+        signature(refs), cached by field names and list-valued fields.
+        """
+        key = tuple((k, isinstance(v, list)) for k, v in refs.items())
+        ukeys = self.__keys.get(key)
+
+        if ukeys is None:
+            ukeys = self.__keys[key] = signature(refs)
+
+        return ukeys
+
+    def __load(self, collection):
+        """
+        Read the rows of a persisted collection, once.
+        Referenced collections are read first so that FK
+        cells resolve to already loaded items.
+        """
+        if collection is None:
+            return
+
+        # Other threads wait for the rows being read
+        with self.__lock:
+            if collection.isLoaded():
+                return
+
+            with self.connection() as conn:
+                run(conn.cursor(), self._loadSteps(collection))
+
+    def _loadSteps(self, collection):
+        if collection is None or collection.isLoaded():
+            return
+
+        collection.markLoaded()
+
+        if collection.id() is None:
+            return
+
+        if self.__lazy:
+            yield from collection.read_fkeys(collection.id())
+
+        for target in collection.foreignKeys().values():
+            yield from self._loadSteps(target)
+
+        yield from collection.read(collection.id())
+
+    def __loadAll(self, refs=None):
+        """
+        Read the collections not loaded yet; with refs, only those
+        having a column for every field of refs.
+        """
+        if not self.__lazy:
+            return
+
+        collections = self.__collections
+
+        if refs:
+            with self.connection() as conn:
+                collections = run(conn.cursor(), self._unloadedWith(refs))
+
+        for collection in collections:
+            self.__load(collection)
+
+    def _unloadedWith(self, refs):
+        """
+        Steps returning the collections not loaded yet having a column
+        for every field of refs. Unknown columns are read from the
+        catalog in one query.
+        """
+        pending = [
+            collection for collection in self.__collections
+            if not collection.isLoaded() and collection.id() is not None
+        ]
+
+        unknown = {
+            collection.id(): collection for collection in pending
+            if collection.knownColumns() is None
+        }
+
+        if unknown:
+            rows = yield ("execute", """
+                SELECT table_name, column_name, udt_name
+                FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = ANY(%s)
+            """, (list(unknown),))
+
+            columns = {}
+
+            for table, column, udt in rows:
+                columns.setdefault(table, []).append((column, udt))
+
+            for table, collection in unknown.items():
+                collection.catalogColumns(columns.get(table, []))
+
+        fields = {field for field, _, _ in lookups(refs)}
+
+        return [
+            collection for collection in pending
+            if fields <= set(collection.knownColumns())
+        ]
 
     @property
     def conn(self):
+        """
+        The session connection, None with a pool.
+        """
         return self.__conn
 
+    @property
+    def pool(self):
+        """
+        The connection pool, None with a connection.
+        """
+        return self.__pool
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Connection for one operation: the session connection, or one
+        taken from the pool. A thread keeps the same pool connection
+        for nested operations; it goes back to the pool, its
+        transaction ended, when the last of them is done.
+        """
+        if self.__pool is None:
+            yield self.__conn
+            return
+
+        held = getattr(self.__local, "held", None)
+
+        if held is None:
+            held = self.__local.held = [self.__pool.getconn(), 0]
+
+        held[1] += 1
+        done = False
+
+        try:
+            yield held[0]
+            done = True
+        finally:
+            held[1] -= 1
+
+            if held[1] == 0:
+                if getattr(self.__local, "held", None) is held:
+                    self.__local.held = None
+
+                conn = held[0]
+
+                try:
+                    if done:
+                        conn.commit()
+                    else:
+                        conn.rollback()
+                finally:
+                    self.__pool.putconn(conn)
+
     def expose(self):
         import inspect
         import pprint
@@ -123,24 +459,156 @@ class LZDB(object):
         return self.newItem(**refs)
 
     def commit(self):
-        self.__createSystemTables()
-        self.__createCollections()
-        self.__saveItems()
-        self.__saveLinks()
+        """
+        Save the session in one transaction of its own connection.
+        Commits of a session run one at a time.
+        """
+        with self.__lock, self.connection() as conn:
+            run(conn.cursor(), self._commitSteps())
+
+    def _commitSteps(self):
+        created = []
+        changed = []
+        saved = []
+
+        try:
+            yield from self.__createSystemTables()
+            yield from self.__createCollections(created)
+            yield from self.__saveItems(changed, saved)
+            links = yield from self.__saveLinks()
+
+            wanted = yield from self.__wantedIndexes()
+
+            yield from self.__createIndexes([w for w in wanted if w[3]])
+
+            yield ("commit",)
+        except Exception:
+            self.__rolledBack(created, changed)
+            raise
 
-        self.__conn.commit()
+        self.__committed(saved, *links)
+
+    def createIndexes(self):
+        """
+        Create the table indexes wanted on existing columns with
+        CREATE INDEX CONCURRENTLY, which does not block writers but
+        waits for the transactions open on the table. Not done by
+        commit(); a build waiting longer than indexLockTimeout is
+        left for the next call. Returns the indexes created, as
+        createdIndexes().
+        """
+        with self.__lock, self.connection() as conn:
+            return run(conn.cursor(), self._indexSteps())
+
+    def _indexSteps(self):
+        wanted = yield from self.__wantedIndexes()
+
+        # Concurrent builds run outside of a transaction
+        yield ("commit",)
+
+        created = len(self.__indexLog)
+
+        yield from self.__createIndexes([w for w in wanted if not w[3]], concurrently=True)
+
+        return self.__indexLog[created:]
+
+    def __wantedIndexes(self):
+        wanted = []
+
+        for collection in self.__collections:
+            indexes = yield from collection.wantedIndexes()
+
+            wanted.extend(
+                (collection, field, reason, fresh)
+                for field, (reason, fresh) in indexes.items()
+            )
+
+        return wanted
+
+    def __createIndexes(self, wanted, concurrently=False):
+        """
+        Create the table indexes wanted by the collections.
+        Columns added by a commit are indexed in its transaction;
+        the others by createIndexes(), with CREATE INDEX CONCURRENTLY.
+        A concurrent build waiting longer than indexLockTimeout
+        is attempted again by the next createIndexes().
+        """
+        if not wanted:
+            return
+
+        if concurrently:
+            autocommit = yield ("autocommit", True)
+            yield ("execute", f"SET lock_timeout = '{self.indexLockTimeout}'", None)
+
+        try:
+            for collection, field, reason, fresh in wanted:
+                table = collection.id()
+                name = f"{table}_{field}_idx"
+
+                try:
+                    if concurrently:
+                        yield from self.__dropInvalidIndex(name)
+                        yield ("execute",
+                            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({field})", None
+                        )
+                    else:
+                        yield ("execute", "SAVEPOINT lzdb_index", None)
+                        yield ("execute", f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({field})", None)
+                        yield ("execute", "RELEASE SAVEPOINT lzdb_index", None)
+                except pg.Error as e:
+                    if concurrently:
+                        # A failed concurrent build leaves an invalid index
+                        yield from self.__dropInvalidIndex(name)
+                    else:
+                        yield ("execute", "ROLLBACK TO SAVEPOINT lzdb_index", None)
+
+                    if not isinstance(e, pg.errors.LockNotAvailable):
+                        collection.indexCreated(field, created=False)
+
+                    if LZDB.traceon:
+                        print(f"Index {name} not created: {e}")
+                    continue
+
+                collection.indexCreated(field)
+                self.__indexLog.append((table, field, reason))
+
+                if LZDB.traceon:
+                    print(f"Created index {name} ({reason})")
+        finally:
+            if concurrently:
+                yield ("execute", "RESET lock_timeout", None)
+                yield ("autocommit", autocommit)
+
+    def __dropInvalidIndex(self, name):
+        try:
+            rows = yield ("execute",
+                "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+                (name,)
+            )
+
+            if rows and rows[0][0]:
+                yield ("execute", f"DROP INDEX CONCURRENTLY IF EXISTS {name}", None)
+        except pg.Error:
+            pass
+
+    def createdIndexes(self):
+        """
+        Table indexes created by this session, as
+        (table, field, reason) tuples.
+        """
+        return list(self.__indexLog)
 
     def __createSystemTables(self):
-        self.__db.execute("""
+        yield ("execute", """
             create table if not exists lzdb(
                 id serial primary key,
                 ukeys varchar,
                 tname varchar,
                 unique(ukeys)
             )
-        """)
+        """, None)
 
-        self.__db.execute("""
+        yield ("execute", """
             create table if not exists lzdb_links(
                 src_collection integer not null,
                 src_id integer not null,
@@ -158,18 +626,72 @@ class LZDB(object):
                     reltype
                 )
             )
-        """)
+        """, None)
 
-    def __createCollections(self):
-        for collection in self.__collections:
-            collection.createTable(self.__db)
+        # Incoming links; checked first, as CREATE INDEX locks the table
+        if self.__systemIndexes:
+            return
+
+        rows = yield ("execute", "select to_regclass('lzdb_links_dst_idx') is not null", None)
+
+        if not rows[0][0]:
+            yield ("execute", """
+                create index if not exists lzdb_links_dst_idx
+                on lzdb_links(dst_collection, dst_id)
+            """, None)
+
+        self.__systemIndexes = True
+
+    def __createCollections(self, created):
+        for collection in self.__ddl:
+            if collection.id() is not None:
+                continue
+
+            yield from collection.createTable()
+            self.__tables[collection.id()] = collection
+            created.append(collection)
+
+        self.__ddl = []
+
+    def __committed(self, saved, rows, kept):
+        """
+        Record what the commit stored, once it succeeded.
+        """
+        for dbitem in saved:
+            dbitem.markLoaded()
+            dbitem.clearDirty()
+
+        if rows and self.__linkCache is not None and self.__linkCache.isLoaded():
+            self.__linkCache.add(rows)
+
+        for dbitem, keep in kept:
+            dbitem.clearPendingLinks(keep)
+
+        # Links to items without an id are retried on the next commit
+        self.__dirty = {
+            key: dbitem
+            for key, dbitem in self.__dirty.items()
+            if dbitem.isDirty() or dbitem.pendingLinks()
+        }
 
-    def __saveItem(self, dbitem):
-        coll = dbitem.collection()
+    def __rolledBack(self, created, changed):
+        """
+        Forget the schema changes of a failed commit, so that
+        the next one makes them again. Its items stay dirty.
+        """
+        self.__systemIndexes = False
+
+        for collection in created:
+            self.__tables.pop(collection.id(), None)
+            collection.rolledBack(created=True)
+            self.__ddl.append(collection)
 
-        # Ensure schema is up to date
-        coll.createNewFields(self.__db, dbitem)
+        for collection in changed:
+            if collection not in created:
+                collection.rolledBack()
 
+    def __rowValues(self, dbitem):
+        collection = dbitem.collection()
         fields = []
         values = []
 
@@ -178,85 +700,177 @@ class LZDB(object):
             if field == "id":
                 continue
 
-            value = dbitem[field]
-
-            if isinstance(value, LZDBItem):
-                value = value.id()
+            value = adapt(dbitem[field], collection.columnType(field))
 
             fields.append(field)
             values.append(value)
 
-        # ------------------------------------------------------------------
-        # UPDATE existing row
-        # ------------------------------------------------------------------
-        if dbitem.isLoaded():
+        return fields, values
 
-            if len(fields) > 0:
+    def __changedValues(self, dbitem):
+        """
+        Changed columns of a loaded item, as
+        (fields, values + [id]) for the UPDATE.
+        """
+        collection = dbitem.collection()
+        fields = []
+        values = []
 
-                assignments = [
-                    f"{field}=%s"
-                    for field in fields
-                ]
+        for field in dbitem.changedFields():
 
-                sql = (
-                    f"UPDATE {coll.id()} "
-                    f"SET {', '.join(assignments)} "
-                    f"WHERE id=%s"
-                )
+            if field == "id" or field not in dbitem:
+                continue
+
+            value = adapt(dbitem[field], collection.columnType(field))
 
-                params = values + [dbitem.id()]
+            fields.append(field)
+            values.append(value)
 
-                self.__db.execute(sql, params)
+        return tuple(fields), values + [dbitem.id()]
 
-            dbitem.clearDirty()
+    def __updateItems(self, dbitems):
+        """
+        UPDATE the changed columns of loaded items,
+        one batch per collection and set of columns.
+        """
+        batches = {}
 
-            return
+        for dbitem in dbitems:
+            fields, params = self.__changedValues(dbitem)
 
-        # ------------------------------------------------------------------
-        # INSERT new row
-        # ------------------------------------------------------------------
-        if len(fields) == 0:
+            if len(fields) > 0:
+                key = (dbitem.collection(), fields)
+                batches.setdefault(key, []).append(params)
+
+        for (coll, fields), params in batches.items():
+
+            assignments = [
+                f"{field}=%s"
+                for field in fields
+            ]
 
             sql = (
-                f"INSERT INTO {coll.id()} "
-                f"DEFAULT VALUES "
-                f"RETURNING id"
+                f"UPDATE {coll.id()} "
+                f"SET {', '.join(assignments)} "
+                f"WHERE id=%s"
             )
 
-            self.__db.execute(sql)
+            yield ("executemany", sql, params)
 
-        else:
+    def __allocateIds(self, coll, dbitems):
+        """
+        Reserve ids from the table sequence, in creation order,
+        so that references between new items resolve before any
+        row is written.
+        """
+        rows = yield ("execute",
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            (coll.id(), len(dbitems))
+        )
 
-            placeholders = ", ".join(["%s"] * len(values))
+        ids = sorted(row[0] for row in rows)
 
-            sql = (
-                f"INSERT INTO {coll.id()} "
-                f"({','.join(fields)}) "
-                f"VALUES ({placeholders}) "
-                f"RETURNING id"
-            )
+        for dbitem, id in zip(dbitems, ids):
+            coll.identify(dbitem, id)
 
-            self.__db.execute(sql, values)
+    def __insertItems(self, coll, dbitems):
+        """
+        COPY new items into the collection table,
+        one COPY per set of columns.
+        """
+        groups = {}
 
-        res = self.__db.fetchone()
+        for dbitem in dbitems:
+            fields, values = self.__rowValues(dbitem)
+            groups.setdefault(tuple(fields), []).append([dbitem.id()] + values)
 
-        if res is not None:
-            dbitem.id(res[0])
+        for fields, rows in groups.items():
+            columns = ", ".join(("id",) + fields)
 
-        dbitem.markLoaded()
-        dbitem.clearDirty()
+            yield ("copy_in", f"COPY {coll.id()} ({columns}) FROM STDIN", rows)
 
-    def __saveItems(self):
-        for dbitem in self.__items:
+    def __insertOrder(self, inserts):
+        """
+        Collections with new items, referenced collections first.
+        """
+        ordered = []
+        visiting = set()
+
+        def visit(coll):
+            if coll in visiting or coll in ordered:
+                return
+
+            visiting.add(coll)
+
+            for dbitem in inserts[coll]:
+                for target in references(dbitem).values():
+                    if target in inserts and target is not coll:
+                        visit(target)
+
+            ordered.append(coll)
+
+        for coll in inserts:
+            visit(coll)
+
+        return ordered
+
+    def __saveItems(self, changed, saved):
+        inserts = {}
+        updates = []
+
+        changes = {}
+
+        for dbitem in self.__dirty.values():
 
             if not dbitem.isDirty():
                 continue
 
-            self.__saveItem(dbitem)
+            coll = dbitem.collection()
+            changes.setdefault(coll, []).append(dbitem)
+
+            if dbitem.isLoaded():
+                updates.append(dbitem)
+            else:
+                inserts.setdefault(coll, []).append(dbitem)
+
+        # Ensure schema is up to date, once per collection
+        for coll, dbitems in changes.items():
+            changed.append(coll)
+            yield from coll.createNewFields(dbitems)
+
+        for coll, dbitems in inserts.items():
+            yield from self.__allocateIds(coll, dbitems)
 
-    def __insertLink(self, src, dst, reltype):
-        self.__db.execute(
-            """
+        for coll in self.__insertOrder(inserts):
+            yield from self.__insertItems(coll, inserts[coll])
+            saved.extend(inserts[coll])
+
+        yield from self.__updateItems(updates)
+        saved.extend(updates)
+
+    def __insertLinks(self, rows):
+        """
+        COPY link rows into a temporary table, then merge
+        them into lzdb_links with a single INSERT.
+        """
+        yield ("execute", """
+            create temp table if not exists lzdb_links_pending(
+                like lzdb_links
+            ) on commit delete rows
+        """, None)
+
+        yield ("copy_in", """
+            copy lzdb_links_pending(
+                src_collection,
+                src_id,
+                dst_collection,
+                dst_id,
+                reltype
+            ) from stdin
+        """, rows)
+
+        yield ("execute", """
             insert into lzdb_links(
                 src_collection,
                 src_id,
@@ -264,160 +878,563 @@ class LZDB(object):
                 dst_id,
                 reltype
             )
-            values(
-                %s,%s,%s,%s,%s
-            )
-            on conflict do nothing
-            """,
-            (
-                src.collection().id().split('__')[1],
-                src.id(),
-                dst.collection().id().split('__')[1],
-                dst.id(),
+            select
+                src_collection,
+                src_id,
+                dst_collection,
+                dst_id,
                 reltype
-            )
-        )
+            from
+                lzdb_links_pending
+            on conflict do nothing
+        """, None)
 
     def __saveLinks(self):
-        for dbitem in self.__items:
+        rows = []
+        kept = []
+
+        for dbitem in self.__dirty.values():
+
+            pending = dbitem.pendingLinks()
+
+            if not pending:
+                continue
+
+            keep = []
 
-            for link in dbitem.links():
+            for link in pending:
 
                 target = link['item']
                 reltype = link['reltype']
 
-                if dbitem.id() is None:
+                # Stored once both ends have an id
+                if dbitem.id() is None or target.id() is None:
+                    keep.append(link)
                     continue
 
-                if target.id() is None:
-                    continue
+                src = (dbitem.collection().number(), dbitem.id())
+                dst = (target.collection().number(), target.id())
 
-                self.__insertLink(
-                    dbitem,
-                    target,
-                    reltype
-                )
+                # One row per pair, whichever end it was linked from
+                if reltype == LZDB_REL_UNDIRECTED and self.__undirectedOnce:
+                    src, dst = min(src, dst), max(src, dst)
+
+                rows.append(src + dst + (reltype,))
 
-                if reltype == LZDB_REL_UNDIRECTED:
+                if reltype == LZDB_REL_UNDIRECTED and not self.__undirectedOnce:
+                    rows.append(dst + src + (reltype,))
 
-                    self.__insertLink(
-                        target,
-                        dbitem,
-                        reltype
-                    )
+            kept.append((dbitem, keep))
 
-    def newItem(self, collection=None, id=None, __loading=False, **refs):
+        if rows:
+            yield from self.__insertLinks(rows)
+
+        return rows, kept
+
+    def newItem(self, collection=None, id=None, **refs):
         # If no collection provided, derive one from virtual PK
         if collection is None:
-            temp = LZDBItem(None, **refs)
-
-            ukeys = temp.virtualKeys()
-            fkeys = temp.foreignKeys()
+            ukeys = self.__signature(refs)
 
             # Try existing collection
-            for coll in self.__collections:
-                if coll.uniqueKeys() == ukeys:
-                    collection = coll
-                    break
-
+            collection = self.__signatures.get(ukeys)
 
             # Otherwise create new collection
             if collection is None:
-                collection = Collection(self, ukeys=ukeys, fkeys=fkeys, dbitem=None, tname='')
-                self.__collections.append(collection)
+                fkeys = references(refs)
+                collection = Collection(self, ukeys=list(ukeys), fkeys=fkeys, dbitem=None, tname='')
+                self.__register(collection)
 
         # Create item bound to collection
-        dbitem = LZDBItem(collection, **refs)
-        self.__items.append(dbitem)
+        with self.__lock:
+            dbitem = LZDBItem(collection, **refs)
+            self.__items.append(dbitem)
+            collection.addItem(dbitem)
+            self.markDirty(dbitem)
 
-        if id is not None:
-            dbitem.id(id)
+            if id is not None:
+                collection.identify(dbitem, id)
 
         return dbitem
 
+    def loadItem(self, collection, fields):
+        """
+        Register an item read from the collection table.
+        fields holds the row, id included. A row already
+        in the session yields the session item.
+        """
+        with self.__lock:
+            dbitem = collection.item(fields['id'])
+
+            if dbitem is not None:
+                return dbitem
+
+            dbitem = LZDBItem.fromRow(collection, fields['id'], fields)
+
+            self.__items.append(dbitem)
+            collection.addItem(dbitem)
+
+        return dbitem
+
+    def markDirty(self, dbitem):
+        """
+        Record dbitem to be visited by the next commit.
+        """
+        self.__dirty[id(dbitem)] = dbitem
+
     def collectionsNames(self):
         return [ collection.name() for collection in self.__collections ]
 
     def collections(self, ukeys = None, fkeys = None, id = None, name = None):
         if name is not None:
-            for collection in self.__collections:
-                if collection.name() == name:
-                    return collection
-            return None
+            collection = self.__names.get(name)
+            if collection is None or collection.name() != name:
+                # Collections may have been renamed since registration
+                self.__names = {}
+                for collection in self.__collections:
+                    self.__names.setdefault(collection.name(), collection)
+                collection = self.__names.get(name)
+            return collection
         if id is not None:
-            for collection in self.__collections:
-                if collection.id() == id:
-                    return collection
-            return None
+            return self.__tables.get(id)
         if ukeys is None:
             return self.__collections
-        ukeys = sorted(ukeys)
-        for collection in self.__collections:
-            if collection.uniqueKeys() == ukeys:
-                return collection
-        collection = Collection(self, ukeys=ukeys, fkeys=fkeys)
-        self.__collections.append(collection)
+        collection = self.__signatures.get(tuple(sorted(ukeys)))
+        if collection is not None:
+            return collection
+        collection = Collection(self, ukeys=ukeys, fkeys=fkeys or {})
+        self.__register(collection)
         return collection
 
     def items(self, collection = None, **refs):
+        if collection is None:
+            self.__loadAll(refs)
+        else:
+            self.__load(collection)
+
+        return self._found(collection, refs)
+
+    def _found(self, collection, refs):
+        """
+        Session items matching refs, in collection or in all.
+        """
         if len(refs) == 0 and collection is None:
             return self.__items
         items = []
         if collection is not None and 'id' in refs:
-            for item in self.__items:
-                if item.id() == refs['id'] and item.collection() == collection:
-                    return item
-            return None
+            return collection.item(refs['id'])
         elif collection is not None:
-            for item in self.__items:
-                if item.collection() == collection:
-                    items.append(item)
+            items.extend(collection.items(**refs))
         else:
-            for item in self.__items:
-                if refs.items() <= item.items():
-                    items.append(item)
+            for collection in self.__collections:
+                items.extend(collection.items(**refs))
         return items
 
-    def linkedItems(self, item, reltype=None):
-        sql = """
-            select
-                dst_collection,
-                dst_id
-            from
-                lzdb_links
-            where
-                src_collection=%s
-            and
-                src_id=%s
+    def iterItems(self, collection, batch_size=1000, raw=False):
+        """
+        Stream the rows of a collection table through a server-side
+        cursor, batch_size rows per round trip. Items are built on the fly
+        and not registered in the session (changes to them are not saved);
+        rows already in the session yield the session item. With raw,
+        rows are yielded as plain dicts.
+        The cursor does not survive a commit.
         """
+        if collection.id() is None:
+            return
 
-        params = [
-            int(item.collection().id().split('__')[1]),
-            item.id()
-        ]
+        with self.connection() as conn:
+            yield from self.__iterRows(conn, collection, batch_size, raw)
 
-        if reltype is not None:
-            sql += " and reltype=%s"
-            params.append(reltype)
+    def __iterRows(self, conn, collection, batch_size, raw):
+        if not collection.isLoaded():
+            run(conn.cursor(), collection.read_fkeys(collection.id()))
 
-        self.__db.execute(sql, params)
+        # References resolve to session items
+        for target in collection.foreignKeys().values():
+            self.__load(target)
 
-        result = []
+        name = f"lzdb_iter_{next(LZDB.__cursors)}"
+
+        with conn.cursor(name=name) as cur:
+            cur.itersize = batch_size
+            cur.execute(f"select * from {collection.id()}")
+
+            fields = None
+
+            for row in cur:
+                if fields is None:
+                    fields = [desc[0] for desc in cur.description]
+
+                pkitems = dict(zip(fields, row))
+
+                yield pkitems if raw else self._streamed(collection, pkitems)
+
+    def _streamed(self, collection, pkitems):
+        """
+        Item of a streamed row: the session item, or an item
+        not registered in the session.
+        """
+        dbitem = collection.item(pkitems['id'])
+
+        if dbitem is None:
+            values = collection.convert(pkitems)
+            dbitem = LZDBItem.fromRow(collection, pkitems['id'], values)
+
+        return dbitem
+
+    def query(self, collection, order_by=None, limit=None, fields=None,
+              page_size=1000, **filters):
+        """
+        Search a collection table in the database rather than in the
+        session. collection is a Collection or a signature (list of
+        fields or 'f1,f2' string); filters take the lookups of items()
+        plus isnull, and are compiled to SQL. Returns a lazy Query
+        fetching page_size rows at a time, ordered by order_by
+        ('-field' for descending) then id.
+        """
+        if collection is not None and not isinstance(collection, Collection):
+            if isinstance(collection, str):
+                collection = collection.split(",")
+            collection = self.__signatures.get(tuple(sorted(collection)))
+
+        return Query(
+            self, collection, filters, order_by=order_by,
+            limit=limit, fields=fields, page_size=page_size
+        )
+
+    def __neighbours(self, direction, reltype, node=None):
+        """
+        SQL of the neighbours (c, i) of a node over lzdb_links, with
+        its parameters. node is a (collection number, id) pair, or None
+        for the columns c, i of a walk row w. Undirected links are
+        followed from both ends, whichever way they were stored.
+        """
+        sides = {
+            LZDB_DIR_OUTGOING: [("src", "dst", False), ("dst", "src", True)],
+            LZDB_DIR_INCOMING: [("dst", "src", False), ("src", "dst", True)],
+            LZDB_DIR_BOTH: [("src", "dst", False), ("dst", "src", False)],
+        }
 
-        for table_name, obj_id in self.__db.fetchall():
+        if direction not in sides:
+            raise ValueError(f"Unknown link direction {direction!r}")
 
-            coll = self.collections(id=f"lzdb__{table_name}")
+        selects = []
+        params = []
 
-            if coll is None:
+        for near, far, undirected in sides[direction]:
+            if undirected and reltype not in (None, LZDB_REL_UNDIRECTED):
                 continue
 
-            obj = self.items(
-                collection=coll,
-                id=obj_id
+            if node is None:
+                sql = f"""
+                    select {far}_collection as c, {far}_id as i
+                    from lzdb_links
+                    where {near}_collection = w.c and {near}_id = w.i
+                """
+            else:
+                sql = f"""
+                    select {far}_collection as c, {far}_id as i
+                    from lzdb_links
+                    where {near}_collection = %s and {near}_id = %s
+                """
+                params.extend(node)
+
+            if undirected:
+                sql += " and reltype = %s"
+                params.append(LZDB_REL_UNDIRECTED)
+            elif reltype is not None:
+                sql += " and reltype = %s"
+                params.append(reltype)
+
+            selects.append(sql)
+
+        return " union all ".join(selects), params
+
+    def __linked(self, item, reltype, direction):
+        """
+        Items one link away from item, read with one query.
+        """
+        with self.connection() as conn:
+            nodes = run(conn.cursor(), self._linkedNodes(item, reltype, direction))
+
+        resolved = self.__resolveLinked(nodes)
+
+        return [
+            resolved[node] for node in nodes
+            if resolved.get(node) is not None
+        ]
+
+    def _linkedNodes(self, item, reltype, direction):
+        """
+        Steps returning the (collection number, id) pairs one
+        link away from item.
+        """
+        if item.id() is None:
+            return []
+
+        node = (item.collection().number(), item.id())
+        neighbours, params = self.__neighbours(direction, reltype, node)
+
+        rows = yield ("execute", f"select distinct c, i from ({neighbours}) n", params)
+
+        return [tuple(row) for row in rows]
+
+    def incomingItems(self, item, reltype=None):
+        """
+        Items linking to item.
+        """
+        if self.__linkCache is not None:
+            return self.neighbours(item, reltype, direction=LZDB_DIR_INCOMING)
+
+        return self.__linked(item, reltype, LZDB_DIR_INCOMING)
+
+    def __resolveLinked(self, nodes):
+        """
+        Items of (collection number, id) pairs, read with one
+        query per collection not loaded yet. Unknown ones map to None.
+        """
+        for coll, missing in self._unresolved(nodes):
+            self.query(coll, id__in=missing).all()
+
+        return self._resolved(nodes)
+
+    def _unresolved(self, nodes):
+        """
+        (collection, ids) of the pairs not in the session, for the
+        collections not loaded yet.
+        """
+        wanted = {}
+
+        for number, id in nodes:
+            coll = self.collections(id=f"lzdb__{number}")
+
+            if coll is not None and not coll.isLoaded() and coll.item(id) is None:
+                wanted.setdefault(coll, set()).add(id)
+
+        return [(coll, sorted(ids)) for coll, ids in wanted.items()]
+
+    def _resolved(self, nodes):
+        """
+        Session items of (collection number, id) pairs, None if unknown.
+        """
+        resolved = {}
+
+        for number, id in nodes:
+            coll = self.collections(id=f"lzdb__{number}")
+            resolved[(number, id)] = None if coll is None else coll.item(id)
+
+        return resolved
+
+    def traverse(self, item, depth=1, reltype=None, direction=LZDB_DIR_OUTGOING):
+        """
+        Items reachable from item through lzdb_links in at most depth
+        hops, as (item, depth, path) tuples, path being the items of
+        a shortest way from item. Walked by a single recursive query
+        that never visits an item twice on a path.
+        direction is LZDB_DIR_OUTGOING, LZDB_DIR_INCOMING or LZDB_DIR_BOTH.
+        """
+        with self.connection() as conn:
+            walk = run(conn.cursor(), self._walkSteps(item, depth, reltype, direction))
+
+        resolved = self.__resolveLinked(
+            {node for _, _, path in walk for node in path[1:]}
+        )
+
+        return self._walked(item, walk, resolved)
+
+    def _walkSteps(self, item, depth, reltype, direction):
+        """
+        Steps returning the walk of traverse(), as (node, depth, path)
+        tuples of (collection number, id) pairs.
+        """
+        if item.id() is None or depth < 1:
+            return []
+
+        neighbours, params = self.__neighbours(direction, reltype)
+
+        # Nodes are encoded as collection << 32 | id in the paths
+        sql = f"""
+            with recursive walk(c, i, depth, path) as (
+                select %s::integer, %s::integer, 0, array[(%s::bigint << 32) | %s]
+                union all
+                select n.c, n.i, w.depth + 1, w.path || ((n.c::bigint << 32) | n.i)
+                from walk w
+                cross join lateral ({neighbours}) n
+                where w.depth < %s
+                and not ((n.c::bigint << 32) | n.i) = any(w.path)
             )
+            select distinct on (c, i) c, i, depth, path
+            from walk
+            where depth > 0
+            order by c, i, depth, path
+        """
+
+        start = (item.collection().number(), item.id())
+
+        rows = yield ("execute", sql, [*start, *start, *params, depth])
 
-            if obj is not None:
-                result.append(obj)
+        return [
+            ((c, i), hops, [(node >> 32, node & 0xFFFFFFFF) for node in path])
+            for c, i, hops, path in rows
+        ]
+
+    def _walked(self, item, walk, resolved):
+        """
+        traverse() result of a walk, given the items of its nodes.
+        """
+        if not walk:
+            return []
+
+        resolved[(item.collection().number(), item.id())] = item
+
+        result = []
+
+        for node, hops, path in walk:
+            found = resolved.get(node)
+
+            if found is None:
+                continue
+
+            result.append((found, hops, [resolved.get(node) for node in path]))
+
+        result.sort(key=lambda entry: (entry[1], entry[0].collection().number(), entry[0].id()))
 
         return result
 
+    def __cachedLinks(self):
+        cache = self.__linkCache
+
+        if cache.isLoaded():
+            return cache
+
+        with self.__lock, self.connection() as conn:
+            if not cache.isLoaded():
+                cache.load(run(conn.cursor(), readLinks()))
+
+        return cache
+
+    def neighbours(self, items, reltype=None, direction=LZDB_DIR_OUTGOING):
+        """
+        Items linked to an item, or to each item of a list (one list
+        of neighbours per item), answered from the in-memory link
+        cache (LZDB(..., linkcache=True)) without querying lzdb_links.
+        Links not committed yet are included.
+        """
+        if self.__linkCache is None:
+            raise ValueError("neighbours() needs LZDB(..., linkcache=True)")
+
+        if direction not in (LZDB_DIR_OUTGOING, LZDB_DIR_INCOMING, LZDB_DIR_BOTH):
+            raise ValueError(f"Unknown link direction {direction!r}")
+
+        single = isinstance(items, LZDBItem)
+
+        if single:
+            items = [items]
+
+        cache = self.__cachedLinks()
+        nodes = [[] for _ in items]
+
+        # Committed links, one lookup per collection
+        groups = {}
+
+        for n, item in enumerate(items):
+            if item.id() is not None:
+                groups.setdefault(item.collection().number(), []).append(n)
+
+        # Undirected links are followed from both ends
+        lookups = []
+        undirected = LZDB_REL_UNDIRECTED if reltype in (None, LZDB_REL_UNDIRECTED) else None
+
+        if direction in (LZDB_DIR_OUTGOING, LZDB_DIR_BOTH):
+            lookups.append((cache.outgoing, reltype))
+        elif undirected is not None:
+            lookups.append((cache.outgoing, undirected))
+
+        if direction in (LZDB_DIR_INCOMING, LZDB_DIR_BOTH):
+            lookups.append((cache.incoming, reltype))
+        elif undirected is not None:
+            lookups.append((cache.incoming, undirected))
+
+        for number, positions in groups.items():
+            ids = [items[n].id() for n in positions]
+
+            for lookup, kind in lookups:
+                for n, pairs in zip(positions, lookup(number, ids, kind)):
+                    nodes[n].extend(pairs)
+
+        resolved = self.__resolveLinked({pair for pairs in nodes for pair in pairs})
+
+        result = [
+            [resolved[pair] for pair in pairs if resolved.get(pair) is not None]
+            for pairs in nodes
+        ]
+
+        # Links still pending in the session
+        positions = {id(item): n for n, item in enumerate(items)}
+
+        for dbitem in list(self.__dirty.values()):
+            for link in dbitem.pendingLinks():
+                if reltype is not None and link['reltype'] != reltype:
+                    continue
+
+                target = link['item']
+                undirected = link['reltype'] == LZDB_REL_UNDIRECTED
+
+                if direction != LZDB_DIR_INCOMING or undirected:
+                    n = positions.get(id(dbitem))
+                    if n is not None:
+                        result[n].append(target)
+
+                if direction != LZDB_DIR_OUTGOING or undirected:
+                    n = positions.get(id(target))
+                    if n is not None:
+                        result[n].append(dbitem)
+
+        # Undirected links may be stored both ways
+        result = [
+            list({id(found): found for found in found_items}.values())
+            for found_items in result
+        ]
+
+        return result[0] if single else result
+
+    def linkGraph(self, reltype=None, collections=None):
+        """
+        lzdb_links as a LinkGraph (CSR arrays, see links.py), built
+        without loading any item. reltype and collections restrict
+        the links; with collections, both ends must belong to them.
+        Undirected links are edges both ways.
+        """
+        with self.connection() as conn:
+            return run(conn.cursor(), self._linkGraphSteps(reltype, collections))
+
+    def _linkGraphSteps(self, reltype, collections):
+        where = []
+        params = []
+
+        if reltype is not None:
+            where.append("reltype = %s")
+            params.append(reltype)
+
+        if collections is not None:
+            numbers = [
+                c.number() if isinstance(c, Collection) else c
+                for c in collections
+            ]
+            where.append("src_collection = any(%s) and dst_collection = any(%s)")
+            params.extend([numbers, numbers])
+
+        links = yield from readLinks(" and ".join(where) or "true", params)
+
+        # Stored once or twice, undirected links go both ways
+        undirected = links[links[:, 4] == LZDB_REL_UNDIRECTED]
+        reverse = undirected[:, [2, 3, 0, 1, 4]]
+
+        return LinkGraph(np.concatenate([links, reverse]))
+
+    def linkedItems(self, item, reltype=None):
+        if self.__linkCache is not None:
+            return self.neighbours(item, reltype)
+
+        return self.__linked(item, reltype, LZDB_DIR_OUTGOING)
+
@@ -1,10 +1,76 @@
+import collections
 import glob
 
+import pandas as pd
+
+def memoryUsage(value):
+    """
+    Bytes held by a loaded value, 0 if not a pandas object.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+
+    return 0
+
+def frozen(value):
+    """
+    Hashable copy of nested lists, for cache keys.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(frozen(v) for v in value)
+
+    if isinstance(value, set):
+        return frozenset(value)
+
+    return value
+
+class lzframe(object):
+    """
+    Handle of a value of an lzdict, read on first use (and again if
+    evicted). Attributes and items are those of the value.
+    """
+    def __init__(self, dd, key, columns=None, filters=None):
+        self.__dd = dd
+        self.__key = key
+        self.__columns = columns
+        self.__filters = filters
+
+    def load(self):
+        return self.__dd.get(self.__key, columns=self.__columns, filters=self.__filters)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __len__(self):
+        return len(self.load())
+
 class lzdict(dict):
+    """
+    Dict loading its values on first access. With a budget (bytes),
+    the least recently used values are evicted once the loaded ones
+    use more memory, and loaded again on their next access. Pinned
+    values are never evicted. get() reads part of a value: some
+    columns, the rows matching filters.
+    """
     __loader = None
+    __budget = None
+    __sizes = None
+    __pinned = None
+    __bytes = 0
+    __hits = 0
+    __misses = 0
+    __evictions = 0
 
     class parquet(object):
-        def get(self, name, folder = "data"):
+        def get(self, name, folder = "data", columns = None, filters = None):
+            from .lzdb import LZDB
+
             filelist = glob.glob("%s/*%s*" % (folder, name))
             if len(filelist) != 1:
                 return None
@@ -12,15 +78,130 @@ class lzdict(dict):
             filename = filepath.split('_')[0].split('/')[1]
             if LZDB.traceon:
                 print("Parquet::Get %s" % filename)
-            return pd.read_parquet(filepath)
+            # Only the columns and row groups needed are read
+            return pd.read_parquet(filepath, columns=columns, filters=filters)
 
-    def __init__(self, loader = None):
+    def __init__(self, loader = None, budget = None):
         self.__loader = loader
         if loader is None:
             self.__loader = lzdict.parquet()
 
+        self.__budget = budget
+
+        # Loaded keys with their size, least recently used first
+        self.__sizes = collections.OrderedDict()
+        self.__pinned = set()
+
     def __getitem__(self, key):
-        if not super().__contains__(key):
-            self[key] = self.__loader.get(key)
+        return self.__cached(key, lambda: self.__loader.get(key))
+
+    def get(self, key, columns = None, filters = None):
+        """
+        Value of key, reading only columns and the rows matching
+        filters ([(column, op, value), ...], as pyarrow) if given.
+        Cached by (key, columns, filters).
+        """
+        if columns is None and filters is None:
+            return self[key]
+
+        options = {}
+
+        if columns is not None:
+            options["columns"] = list(columns)
+
+        if filters is not None:
+            options["filters"] = filters
+
+        return self.__cached(
+            (key, frozen(columns), frozen(filters)),
+            lambda: self.__loader.get(key, **options)
+        )
+
+    def lazy(self, key, columns = None, filters = None):
+        """
+        lzframe of get(key, columns, filters), read on first use.
+        """
+        return lzframe(self, key, columns=columns, filters=filters)
+
+    def __cached(self, key, load):
+        if super().__contains__(key):
+            self.__hits += 1
+            if key in self.__sizes:
+                self.__sizes.move_to_end(key)
+        else:
+            self.__misses += 1
+            self[key] = load()
         return super().__getitem__(key)
 
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.__forget(key)
+        self.__sizes[key] = memoryUsage(value)
+        self.__bytes += self.__sizes[key]
+        self.__evict(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.__forget(key)
+        self.__pinned.discard(key)
+
+    def pop(self, key, *default):
+        self.__forget(key)
+        self.__pinned.discard(key)
+        return super().pop(key, *default)
+
+    def clear(self):
+        super().clear()
+        self.__sizes.clear()
+        self.__pinned.clear()
+        self.__bytes = 0
+
+    def __forget(self, key):
+        self.__bytes -= self.__sizes.pop(key, 0)
+
+    def __evict(self, keep):
+        """
+        Drop least recently used values until within the budget,
+        except keep and the pinned ones.
+        """
+        if self.__budget is None:
+            return
+
+        for key in list(self.__sizes):
+            if self.__bytes <= self.__budget:
+                break
+
+            if key == keep or key in self.__pinned:
+                continue
+
+            super().__delitem__(key)
+            self.__forget(key)
+            self.__evictions += 1
+
+    def pin(self, key):
+        """
+        Load key if needed and keep it loaded.
+        """
+        value = self[key]
+        self.__pinned.add(key)
+        return value
+
+    def unpin(self, key):
+        self.__pinned.discard(key)
+        self.__evict(None)
+
+    def memoryUsage(self):
+        """
+        Bytes held by the loaded values.
+        """
+        return self.__bytes
+
+    def stats(self):
+        return {
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "evictions": self.__evictions,
+            "loaded": len(self),
+            "bytes": self.memoryUsage(),
+            "budget": self.__budget,
+        }
@@ -0,0 +1,285 @@
+################################################################################
+#
+#  Copyright (C) 2019 Fabien Bouleau
+#
+#  This file is part of lzdb.
+#
+# lzdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lzdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with lzdb. If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+import itertools
+
+from .collection import parseDates, parseNumber
+from .index import lookups
+from .sqltypes import adapt
+from .steps import run
+
+OPERATORS = {
+    "exact": "=",
+    "gt": ">",
+    "gte": ">=",
+    "lt": "<",
+    "lte": "<=",
+}
+
+def escapeLike(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def where(collection, columns, filters):
+    """
+    Parameterised WHERE clause of filters against the collection
+    table, as (sql, params). Filters on unknown fields match nothing,
+    as with items().
+    """
+    clauses = []
+    params = []
+
+    for field, lookup, value in lookups(filters):
+        if field not in columns:
+            return "FALSE", []
+
+        sqltype = collection.columnType(field)
+
+        # Values are cast to the column type: a field stored as text
+        # can still be filtered with an int or a datetime
+        cast = f"::{sqltype}" if sqltype else ""
+
+        if lookup == "isnull":
+            clauses.append(f"{field} IS {'' if value else 'NOT '}NULL")
+
+        elif lookup == "exact" and value is None:
+            clauses.append(f"{field} IS NULL")
+
+        elif lookup == "in":
+            value = list(value)
+            values = [adapt(v, sqltype) for v in value if v is not None]
+            clause = f"{field} = ANY(%s{cast}[])" if cast else f"{field} = ANY(%s)"
+
+            if len(values) < len(value):
+                clause = f"({clause} OR {field} IS NULL)"
+
+            clauses.append(clause)
+            params.append(values)
+
+        elif lookup == "startswith":
+            if sqltype != "VARCHAR" or not isinstance(value, str):
+                raise ValueError(f"startswith needs a text field and value, not {field}")
+
+            clauses.append(f"{field} LIKE %s")
+            params.append(escapeLike(value) + "%")
+
+        else:
+            clauses.append(f"{field} {OPERATORS[lookup]} %s{cast}")
+            params.append(adapt(value, sqltype))
+
+    return " AND ".join(clauses) or "TRUE", params
+
+class Query(object):
+    """
+    Lazy result of LZDB.query(). Rows are fetched from the
+    collection table in pages when iterated, and merged into the
+    session: a row already loaded yields the session item.
+    With fields, rows are yielded as plain dicts of id and fields.
+    Filters are evaluated by the database, on committed data.
+    """
+    __cursors = itertools.count(1)
+
+    def __init__(self, dbms, collection, filters, order_by=None,
+                 limit=None, fields=None, page_size=1000):
+        self.__dbms = dbms
+        self.__collection = collection
+        self.__filters = filters
+        self.__limit = limit
+        self.__fields = fields
+        self.__pageSize = page_size
+
+        if isinstance(order_by, str):
+            order_by = [order_by]
+
+        self.__orderBy = list(order_by or [])
+
+    def collection(self):
+        return self.__collection
+
+    def __columns(self, db, names):
+        columns = run(db, self.__collection.columns())
+
+        for name in names:
+            if name not in columns:
+                raise ValueError(f"{self.__collection.id()} has no field {name}")
+
+        return columns
+
+    def sql(self, db=None):
+        """
+        (sql, params) of the query.
+        """
+        collection = self.__collection
+
+        if db is None:
+            with self.__dbms.connection() as conn:
+                return self.sql(conn.cursor())
+
+        order = [
+            f"{name[1:]} DESC" if name.startswith("-") else name
+            for name in self.__orderBy
+        ]
+
+        names = [name.split()[0] for name in order]
+        columns = self.__columns(db, names + list(self.__fields or []))
+
+        # id last, so that pages come in a stable order
+        if "id" not in names:
+            order.append("id")
+
+        select = "*"
+
+        if self.__fields is not None:
+            select = ", ".join(["id"] + [f for f in self.__fields if f != "id"])
+
+        clause, params = where(collection, columns, self.__filters)
+
+        sql = f"SELECT {select} FROM {collection.id()} WHERE {clause} ORDER BY {', '.join(order)}"
+
+        if self.__limit is not None:
+            sql += " LIMIT %s"
+            params.append(self.__limit)
+
+        return sql, params
+
+    def __iter__(self):
+        collection = self.__collection
+
+        if collection is None or collection.id() is None:
+            return
+
+        with self.__dbms.connection() as conn:
+            yield from self.__fetch(conn)
+
+    def __fetch(self, conn):
+        collection = self.__collection
+        db = conn.cursor()
+
+        # References of a collection not read yet
+        if not collection.isLoaded():
+            run(db, collection.read_fkeys(collection.id()))
+
+        sql, params = self.sql(db)
+
+        collection.queried(field for field, _, _ in lookups(self.__filters))
+
+        if self.__dbms.traceon:
+            print(f"Query on {collection.id()}: {sql} {params}")
+
+        name = f"lzdb_query_{next(Query.__cursors)}"
+
+        with conn.cursor(name=name) as cur:
+            cur.execute(sql, params)
+
+            while True:
+                rows = cur.fetchmany(self.__pageSize)
+
+                if not rows:
+                    break
+
+                fields = [desc[0] for desc in cur.description]
+
+                yield from self.__merge(fields, rows)
+
+    def __merge(self, fields, rows):
+        """
+        Items (or dicts) of a page of rows.
+        """
+        collection = self.__collection
+        fkeys = collection.foreignKeys()
+
+        columns = [list(column) for column in zip(*rows)]
+
+        for i, field in enumerate(fields):
+            if field in fkeys:
+                columns[i] = self.__resolve(fkeys[field], columns[i])
+            elif collection.columnType(field) in ("VARCHAR", None):
+                columns[i] = parseDates(columns[i])
+            elif collection.columnType(field) == "NUMERIC":
+                columns[i] = [parseNumber(value) for value in columns[i]]
+
+        for row in zip(*columns):
+            values = dict(zip(fields, row))
+
+            if self.__fields is not None:
+                yield values
+                continue
+
+            dbitem = collection.item(values["id"])
+
+            if dbitem is None:
+                dbitem = self.__dbms.loadItem(collection, values)
+
+            yield dbitem
+
+    def __resolve(self, target, ids):
+        """
+        Referenced items of ids, fetched in one query
+        if their collection is not loaded.
+        """
+        missing = {
+            value for value in ids
+            if value is not None and target.item(value) is None
+        }
+
+        if missing and not target.isLoaded():
+            Query(self.__dbms, target, {"id__in": sorted(missing)}).all()
+
+        return [None if value is None else target.item(value) for value in ids]
+
+    def all(self):
+        return list(self)
+
+    def first(self):
+        """
+        First matching item, or None.
+        """
+        query = Query(
+            self.__dbms, self.__collection, self.__filters,
+            order_by=self.__orderBy, limit=1, fields=self.__fields
+        )
+
+        for item in query:
+            return item
+
+        return None
+
+    def count(self):
+        """
+        Number of matching rows, counted by the database.
+        """
+        collection = self.__collection
+
+        if collection is None or collection.id() is None:
+            return 0
+
+        with self.__dbms.connection() as conn:
+            db = conn.cursor()
+            clause, params = where(collection, run(db, collection.columns()), self.__filters)
+
+            collection.queried(field for field, _, _ in lookups(self.__filters))
+
+            db.execute(f"SELECT COUNT(*) FROM {collection.id()} WHERE {clause}", params)
+            count = db.fetchone()[0]
+
+        if self.__limit is not None:
+            count = min(count, self.__limit)
+
+        return count
@@ -0,0 +1,124 @@
+################################################################################
+#
+#  Copyright (C) 2019 Fabien Bouleau
+#
+#  This file is part of lzdb.
+#
+# lzdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lzdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with lzdb. If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+import datetime
+
+from psycopg.types.json import Jsonb
+
+from .item import LZDBItem
+
+# Column types, by PostgreSQL type name (udt_name) and by type OID
+TYPES = {
+    "bool": "BOOLEAN",
+    "int2": "INTEGER",
+    "int4": "INTEGER",
+    "int8": "BIGINT",
+    "numeric": "NUMERIC",
+    "float4": "DOUBLE PRECISION",
+    "float8": "DOUBLE PRECISION",
+    "date": "DATE",
+    "timestamp": "TIMESTAMP",
+    "timestamptz": "TIMESTAMPTZ",
+    "bytea": "BYTEA",
+    "json": "JSONB",
+    "jsonb": "JSONB",
+    "varchar": "VARCHAR",
+    "text": "VARCHAR",
+}
+
+OIDS = {
+    16: "BOOLEAN",
+    21: "INTEGER",
+    23: "INTEGER",
+    20: "BIGINT",
+    1700: "NUMERIC",
+    700: "DOUBLE PRECISION",
+    701: "DOUBLE PRECISION",
+    1082: "DATE",
+    1114: "TIMESTAMP",
+    1184: "TIMESTAMPTZ",
+    17: "BYTEA",
+    114: "JSONB",
+    3802: "JSONB",
+    1043: "VARCHAR",
+    25: "VARCHAR",
+}
+
+# Safe widenings between two column types; anything else becomes VARCHAR.
+# BIGINT to DOUBLE PRECISION keeps integers exact up to 2**53 only.
+WIDENINGS = {
+    frozenset(("INTEGER", "BIGINT")): "BIGINT",
+    frozenset(("INTEGER", "DOUBLE PRECISION")): "DOUBLE PRECISION",
+    frozenset(("BIGINT", "DOUBLE PRECISION")): "DOUBLE PRECISION",
+    frozenset(("INTEGER", "NUMERIC")): "NUMERIC",
+    frozenset(("BIGINT", "NUMERIC")): "NUMERIC",
+    frozenset(("DOUBLE PRECISION", "NUMERIC")): "NUMERIC",
+    frozenset(("DATE", "TIMESTAMP")): "TIMESTAMP",
+    frozenset(("DATE", "TIMESTAMPTZ")): "TIMESTAMPTZ",
+    frozenset(("TIMESTAMP", "TIMESTAMPTZ")): "TIMESTAMPTZ",
+}
+
+def sqlType(value):
+    """
+    Column type for a Python value, None if the value says nothing
+    about the type (None, references).
+    """
+    if value is None or isinstance(value, LZDBItem):
+        return None
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    if isinstance(value, int):
+        # Integers out of the BIGINT range are kept exact
+        return "BIGINT" if -2**63 <= value < 2**63 else "NUMERIC"
+    if isinstance(value, float):
+        return "DOUBLE PRECISION"
+    if isinstance(value, datetime.datetime):
+        # Naive datetimes stay naive on reload
+        return "TIMESTAMPTZ" if value.tzinfo is not None else "TIMESTAMP"
+    if isinstance(value, datetime.date):
+        return "DATE"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "BYTEA"
+    if isinstance(value, (dict, list)):
+        return "JSONB"
+    return "VARCHAR"
+
+def widen(current, new):
+    """
+    Narrowest column type holding values of both types.
+    """
+    if current is None:
+        return new
+    if new is None or current == new:
+        return current
+    return WIDENINGS.get(frozenset((current, new)), "VARCHAR")
+
+def adapt(value, sqltype):
+    """
+    Value to send for a column of the given type.
+    """
+    if isinstance(value, LZDBItem):
+        return value.id()
+    if isinstance(value, dict):
+        return Jsonb(value)
+    if sqltype == "JSONB" and isinstance(value, list):
+        return Jsonb(value)
+    return value
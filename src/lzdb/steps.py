@@ -0,0 +1,152 @@
+################################################################################
+#
+#  Copyright (C) 2019 Fabien Bouleau
+#
+#  This file is part of lzdb.
+#
+# lzdb is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lzdb is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with lzdb. If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+# Database work is written once, as generators yielding the statements
+# to run, and run by a cursor or by an async cursor:
+#
+#   ("execute", sql, params)          -> rows, or None without result
+#   ("executemany", sql, params)      -> None
+#   ("describe", sql)                 -> [(column name, type oid), ...]
+#   ("copy_in", sql, rows)            -> None
+#   ("copy_out", sql, types, params)  -> rows of a binary COPY
+#   ("autocommit", flag)              -> the previous flag
+#   ("commit",)                       -> None
+#
+# A database error is raised inside the generator, at the yield of
+# the failed statement. run() returns what the generator returns.
+
+import psycopg as pg
+
+def run(db, steps):
+    """
+    Run steps with a cursor.
+    """
+    result = None
+    error = None
+
+    while True:
+        try:
+            step = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+
+        result = None
+        error = None
+
+        try:
+            result = perform(db, step)
+        except pg.Error as e:
+            error = e
+
+async def arun(db, steps):
+    """
+    Run steps with an async cursor.
+    """
+    result = None
+    error = None
+
+    while True:
+        try:
+            step = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+
+        result = None
+        error = None
+
+        try:
+            result = await aperform(db, step)
+        except pg.Error as e:
+            error = e
+
+def perform(db, step):
+    kind = step[0]
+
+    if kind == "execute":
+        db.execute(step[1], step[2])
+        return db.fetchall() if db.description is not None else None
+
+    if kind == "executemany":
+        db.executemany(step[1], step[2])
+        return None
+
+    if kind == "describe":
+        db.execute(step[1])
+        return [(desc.name, desc.type_code) for desc in db.description]
+
+    if kind == "copy_in":
+        with db.copy(step[1]) as copy:
+            for row in step[2]:
+                copy.write_row(row)
+        return None
+
+    if kind == "copy_out":
+        with db.copy(step[1], step[3]) as copy:
+            copy.set_types(step[2])
+            return list(copy.rows())
+
+    if kind == "autocommit":
+        previous = db.connection.autocommit
+        db.connection.autocommit = step[1]
+        return previous
+
+    if kind == "commit":
+        db.connection.commit()
+        return None
+
+    raise ValueError(f"Unknown step {kind!r}")
+
+async def aperform(db, step):
+    kind = step[0]
+
+    if kind == "execute":
+        await db.execute(step[1], step[2])
+        return await db.fetchall() if db.description is not None else None
+
+    if kind == "executemany":
+        await db.executemany(step[1], step[2])
+        return None
+
+    if kind == "describe":
+        await db.execute(step[1])
+        return [(desc.name, desc.type_code) for desc in db.description]
+
+    if kind == "copy_in":
+        async with db.copy(step[1]) as copy:
+            for row in step[2]:
+                await copy.write_row(row)
+        return None
+
+    if kind == "copy_out":
+        async with db.copy(step[1], step[3]) as copy:
+            copy.set_types(step[2])
+            return [row async for row in copy.rows()]
+
+    if kind == "autocommit":
+        previous = db.connection.autocommit
+        await db.connection.set_autocommit(step[1])
+        return previous
+
+    if kind == "commit":
+        await db.connection.commit()
+        return None
+
+    raise ValueError(f"Unknown step {kind!r}")
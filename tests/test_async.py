@@ -0,0 +1,196 @@
+import asyncio
+import uuid
+
+import pytest
+import psycopg as pg
+from lzdb import *
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+async def fresh_db(**kwargs):
+    conn = await pg.AsyncConnection.connect(
+        dbname="test",
+        host="localhost"
+    )
+    return await AsyncLZDB.connect(conn, **kwargs)
+
+
+def unique_field():
+    return f"aio_{uuid.uuid4().hex[:8]}"
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_async_commit_and_reload():
+    field = unique_field()
+
+    async def scenario():
+        dbms = await fresh_db()
+
+        sat = dbms.newItem(**{field: "SAT"})
+        m = dbms.newItem(**{field: "M", "satellite": sat, "count": 3})
+        sat.link(m)
+
+        await dbms.commit()
+
+        reloaded = await fresh_db(lazy=True)
+        coll = reloaded.collections(id=m.collection().id())
+
+        found = await reloaded.items(collection=coll, **{field: "M"})
+        linked = await reloaded.linkedItems(found[0]["satellite"])
+        incoming = await reloaded.incomingItems(found[0])
+
+        return found, linked, incoming
+
+    found, linked, incoming = asyncio.run(scenario())
+
+    assert len(found) == 1
+    assert found[0]["count"] == 3
+    assert found[0]["satellite"][field] == "SAT"
+    assert [item[field] for item in linked] == ["M"]
+    assert [item[field] for item in incoming] == ["SAT"]
+
+
+def test_async_concurrent_producers():
+    field = unique_field()
+
+    async def scenario():
+        dbms = await fresh_db()
+
+        async def produce(n):
+            hub = dbms.newItem(**{field: f"HUB{n}"})
+            hub.link([dbms.newItem(**{field: f"LEAF{n}_{k}"}) for k in range(3)])
+            await dbms.commit()
+            return hub
+
+        hubs = await asyncio.gather(*(produce(n) for n in range(20)))
+
+        reader = await fresh_db(lazy=True)
+        coll = reader.collections(id=hubs[0].collection().id())
+
+        async def linked(hub):
+            found = await reader.items(collection=coll, id=hub.id())
+            return sorted(item[field] for item in await reader.linkedItems(found))
+
+        return await asyncio.gather(*(linked(hub) for hub in hubs))
+
+    results = asyncio.run(scenario())
+
+    assert results == [[f"LEAF{n}_{k}" for k in range(3)] for n in range(20)]
+
+
+def test_async_iter_items():
+    field = unique_field()
+
+    async def scenario():
+        dbms = await fresh_db()
+
+        for n in range(50):
+            dbms.newItem(**{field: n})
+
+        await dbms.commit()
+
+        reader = await fresh_db(lazy=True)
+        coll = reader.collections(ukeys=[field])
+
+        values = [item[field] async for item in reader.iterItems(coll, batch_size=7)]
+        raw = [row async for row in reader.iterItems(coll, raw=True)]
+
+        return values, raw, coll.isLoaded()
+
+    values, raw, loaded = asyncio.run(scenario())
+
+    assert sorted(values) == list(range(50))
+    assert len(raw) == 50 and isinstance(raw[0], dict)
+    assert not loaded
+
+
+def test_async_ensure():
+    field = unique_field()
+
+    async def scenario():
+        dbms = await fresh_db()
+
+        first = await dbms.ensure(**{field: "ONE"})
+        other = dbms.newItem(**{f"{field}_other": "TWO"})
+        await dbms.commit()
+
+        again = await fresh_db(lazy=True)
+        second = await again.ensure(**{field: "ONE"})
+
+        return first, second, again.collections(id=other.collection().id()).isLoaded()
+
+    first, second, loaded = asyncio.run(scenario())
+
+    assert second.id() == first.id()
+    assert not loaded
+
+
+def test_async_pool():
+    psycopg_pool = pytest.importorskip("psycopg_pool")
+    field = unique_field()
+
+    async def scenario():
+        async with psycopg_pool.AsyncConnectionPool(
+            "dbname=test host=localhost", min_size=2, max_size=2
+        ) as pool:
+            dbms = await AsyncLZDB.connect(pool, lazy=True)
+
+            a = dbms.newItem(**{field: "A"})
+            b = dbms.newItem(**{field: "B"})
+            a.link(b)
+
+            await dbms.commit()
+
+            reader = await AsyncLZDB.connect(pool, lazy=True)
+            found = await reader.items(collection=reader.collections(ukeys=[field]), id=a.id())
+
+            return [item[field] for item in await reader.linkedItems(found)]
+
+    assert asyncio.run(scenario()) == ["B"]
+
+
+def test_async_traverse_and_link_graph():
+    field = unique_field()
+
+    async def scenario():
+        dbms = await fresh_db()
+
+        a, b, c = (dbms.newItem(**{field: name}) for name in "ABC")
+        a.link(b)
+        b.link(c)
+
+        await dbms.commit()
+
+        reader = await fresh_db(lazy=True)
+        coll = reader.collections(ukeys=[field])
+        start = await reader.items(collection=coll, id=a.id())
+
+        walk = await reader.traverse(start, depth=2)
+        graph = await reader.linkGraph(collections=[coll])
+
+        return walk, graph
+
+    walk, graph = asyncio.run(scenario())
+
+    assert [(item[field], depth) for item, depth, path in walk] == [("B", 1), ("C", 2)]
+    assert [node[field] for node in walk[1][2]] == ["A", "B", "C"]
+    assert graph.size() == 3
+
+
+def test_async_needs_connect():
+    async def scenario():
+        conn = await pg.AsyncConnection.connect(dbname="test", host="localhost")
+
+        try:
+            with pytest.raises(ValueError):
+                AsyncLZDB(conn)
+        finally:
+            await conn.close()
+
+    asyncio.run(scenario())
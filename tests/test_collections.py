@@ -185,3 +185,26 @@ def test_empty_virtual_key_collection():
 
     assert a.collection() is b.collection()
 
+
+def test_collection_registry_lookups():
+    dbms = fresh_db()
+
+    item = dbms.newItem(
+        registry_a="1",
+        registry_b="2"
+    )
+
+    item.collection().name("REGISTRY_COLLECTION")
+
+    dbms.commit()
+
+    collection = item.collection()
+
+    assert dbms.collections(ukeys=["registry_b", "registry_a"]) is collection
+    assert dbms.collections(id=collection.id()) is collection
+    assert dbms.collections(name="REGISTRY_COLLECTION") is collection
+
+    collection.name("REGISTRY_RENAMED")
+
+    assert dbms.collections(name="REGISTRY_RENAMED") is collection
+    assert dbms.collections(name="REGISTRY_COLLECTION") is None
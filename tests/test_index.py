@@ -0,0 +1,152 @@
+import psycopg as pg
+from lzdb import LZDB
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db():
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False)
+    dbms.expose()
+    return dbms
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_repeated_filter_builds_index():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="INDEX_BUILD_SAT")
+    collection = sat.collection()
+
+    dbms.items(name="INDEX_BUILD_SAT")
+
+    assert collection.index("name") is None
+
+    dbms.items(name="INDEX_BUILD_SAT")
+
+    assert collection.index("name") is not None
+
+
+def test_index_follows_field_updates():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="INDEX_UPDATE_OLD")
+    sat.collection().createIndex("name")
+
+    sat["name"] = "INDEX_UPDATE_NEW"
+
+    assert sat not in dbms.items(name="INDEX_UPDATE_OLD")
+    assert dbms.items(name="INDEX_UPDATE_NEW") == [sat]
+
+    sat.set(name="INDEX_UPDATE_LAST")
+
+    assert dbms.items(name="INDEX_UPDATE_NEW") == []
+    assert dbms.ensure(name="INDEX_UPDATE_LAST") is sat
+
+
+def test_index_covers_fields_added_later():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="INDEX_LATE_SAT")
+    sat.collection().createIndex("operator")
+
+    other = dbms.newItem(name="INDEX_LATE_OTHER")
+    other["operator"] = "INDEX_LATE_ESA"
+
+    assert dbms.items(operator="INDEX_LATE_ESA") == [other]
+
+
+def test_index_on_reference_field():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="INDEX_FK_SAT")
+
+    event = dbms.newItem(
+        satellite=sat,
+        timestamp="INDEX_FK_EVENT"
+    )
+
+    event.collection().createIndex("satellite")
+
+    found = dbms.items(collection=event.collection(), satellite=sat)
+
+    assert len(found) == 1
+    assert found[0] is event
+
+def test_range_lookups():
+    dbms = fresh_db()
+
+    params = [
+        dbms.newItem(range_param=str(year), range_tag="RANGE_LOOKUP")
+        for year in range(2000, 2010)
+    ]
+
+    collection = params[0].collection()
+
+    for _ in range(3):
+        found = dbms.items(
+            collection=collection,
+            range_param__gte="2003",
+            range_param__lt="2006"
+        )
+
+        assert sorted(item["range_param"] for item in found) == ["2003", "2004", "2005"]
+
+    assert collection.index("range_param", ordered=True) is not None
+
+    assert len(dbms.items(collection=collection, range_param__gt="2008")) == 1
+    assert len(dbms.items(collection=collection, range_param__lte="2001")) == 2
+
+
+def test_range_index_follows_field_updates():
+    dbms = fresh_db()
+
+    item = dbms.newItem(range_value="b", range_tag="RANGE_UPDATE")
+    collection = item.collection()
+    collection.createIndex("range_value", ordered=True)
+
+    item["range_value"] = "z"
+
+    assert dbms.items(collection=collection, range_value__lt="c") == []
+    assert dbms.items(collection=collection, range_value__gt="y") == [item]
+
+
+def test_in_and_startswith_lookups():
+    dbms = fresh_db()
+
+    names = ["LOOKUP_ALPHA", "LOOKUP_BETA", "OTHER_GAMMA"]
+    items = [dbms.newItem(lookup_name=name) for name in names]
+    collection = items[0].collection()
+
+    for _ in range(3):
+        found = dbms.items(
+            collection=collection,
+            lookup_name__in=["LOOKUP_ALPHA", "OTHER_GAMMA", "MISSING"]
+        )
+
+        assert sorted(item["lookup_name"] for item in found) == ["LOOKUP_ALPHA", "OTHER_GAMMA"]
+
+        found = dbms.items(
+            collection=collection,
+            lookup_name__startswith="LOOKUP_"
+        )
+
+        assert sorted(item["lookup_name"] for item in found) == ["LOOKUP_ALPHA", "LOOKUP_BETA"]
+
+
+def test_range_lookup_on_mixed_types_scans():
+    dbms = fresh_db()
+
+    a = dbms.newItem(mixed_value=1)
+    b = dbms.newItem(mixed_value="x")
+
+    for _ in range(3):
+        assert dbms.items(collection=a.collection(), mixed_value__gt=0) == [a]
@@ -0,0 +1,68 @@
+import psycopg as pg
+from lzdb import LZDB
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(lazy=False):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False, lazy=lazy)
+    dbms.expose()
+    return dbms
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_iter_items_streams_without_registering():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(iter_name="ITER_SAT")
+
+    for i in range(25):
+        dbms.newItem(iter_satellite=sat, iter_value=str(i))
+
+    dbms.commit()
+
+    collection_id = dbms.items(iter_satellite=sat)[0].collection().id()
+
+    lazy = LZDB(dbms.conn, lazy=True)
+    collection = lazy.collections(id=collection_id)
+
+    streamed = list(lazy.iterItems(collection, batch_size=4))
+    values = {item["iter_value"] for item in streamed}
+
+    assert {str(i) for i in range(25)} <= values
+    assert not collection.isLoaded()
+    assert all(item.isLoaded() and not item.isDirty() for item in streamed)
+    assert all(lazy.items(collection=collection, id=item.id()) is not item for item in streamed)
+    assert streamed[0]["iter_satellite"]["iter_name"] == "ITER_SAT"
+
+
+def test_iter_items_raw_rows():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(iter_raw_name="ITER_RAW_SAT")
+
+    dbms.commit()
+
+    rows = list(dbms.iterItems(sat.collection(), raw=True))
+
+    assert {"id": sat.id(), "iter_raw_name": "ITER_RAW_SAT"} in rows
+
+
+def test_iter_items_yields_session_items():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(iter_session_name="ITER_SESSION_SAT")
+
+    dbms.commit()
+
+    assert sat in list(dbms.iterItems(sat.collection()))
+    assert any(item is sat for item in dbms.iterItems(sat.collection()))
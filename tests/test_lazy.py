@@ -0,0 +1,115 @@
+import psycopg as pg
+from lzdb import LZDB
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(lazy=False):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False, lazy=lazy)
+    dbms.expose()
+    return dbms
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_lazy_startup_reads_no_rows():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="LAZY_STARTUP_SAT")
+
+    dbms.commit()
+
+    lazy = LZDB(dbms.conn, lazy=True)
+
+    collection = lazy.collections(id=sat.collection().id())
+
+    assert collection is not None
+    assert not collection.isLoaded()
+
+
+def test_lazy_collection_loaded_on_access():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="LAZY_ACCESS_SAT")
+
+    dbms.commit()
+
+    lazy = LZDB(dbms.conn, lazy=True)
+
+    collection = lazy.collections(id=sat.collection().id())
+    loaded = lazy.items(collection=collection, id=sat.id())
+
+    assert collection.isLoaded()
+    assert loaded is not None
+    assert loaded["name"] == "LAZY_ACCESS_SAT"
+
+
+def test_lazy_fk_target_loaded_with_referencing_collection():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="LAZY_FK_SAT")
+
+    event = dbms.newItem(
+        satellite=sat,
+        timestamp="LAZY_FK_EVENT"
+    )
+
+    dbms.commit()
+
+    lazy = LZDB(dbms.conn, lazy=True)
+
+    collection = lazy.collections(id=event.collection().id())
+    reloaded = lazy.items(collection=collection, id=event.id())
+
+    assert reloaded["satellite"].id() == sat.id()
+    assert lazy.collections(id=sat.collection().id()).isLoaded()
+
+
+def test_lazy_ensure_finds_persisted_item():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="LAZY_ENSURE_SAT")
+    other = dbms.newItem(lazy_ensure_other="LAZY_ENSURE_OTHER")
+
+    dbms.commit()
+
+    lazy = LZDB(dbms.conn, lazy=True)
+
+    found = lazy.ensure(name="LAZY_ENSURE_SAT")
+
+    assert found.id() is not None
+    assert found.isLoaded()
+
+    # Collections without a name column are not read
+    assert not lazy.collections(id=other.collection().id()).isLoaded()
+    assert lazy.collections(id=sat.collection().id()).isLoaded()
+
+
+def test_lazy_load_does_not_duplicate_session_items():
+    dbms = fresh_db()
+
+    dbms.newItem(name="LAZY_DUPLICATE_SAT")
+
+    dbms.commit()
+
+    lazy = LZDB(dbms.conn, lazy=True)
+
+    created = lazy.newItem(name="LAZY_DUPLICATE_SAT")
+
+    lazy.commit()
+
+    matches = [
+        item for item in lazy.items(collection=created.collection())
+        if item.id() == created.id()
+    ]
+
+    assert matches == [created]
+    assert matches[0] is created
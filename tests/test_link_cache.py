@@ -0,0 +1,99 @@
+import psycopg as pg
+from lzdb import *
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(linkcache=True):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False, linkcache=linkcache)
+    dbms.expose()
+    return dbms
+
+
+def names(items):
+    return sorted(item["cache_name"] for item in items)
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_cache_answers_committed_links():
+    dbms = fresh_db(linkcache=False)
+
+    sat = dbms.newItem(cache_name="CACHE_SAT")
+    m1 = dbms.newItem(cache_name="CACHE_M1")
+    m2 = dbms.newItem(cache_name="CACHE_M2")
+
+    sat.link([m1, m2])
+
+    dbms.commit()
+
+    cached = fresh_db()
+
+    sat = cached.items(collection=cached.collections(id=sat.collection().id()), id=sat.id())
+    m1 = cached.items(collection=sat.collection(), id=m1.id())
+
+    assert names(cached.neighbours(sat)) == ["CACHE_M1", "CACHE_M2"]
+    assert names(cached.linkedItems(sat)) == ["CACHE_M1", "CACHE_M2"]
+    assert names(cached.neighbours(m1, direction=LZDB_DIR_INCOMING)) == ["CACHE_SAT"]
+
+
+def test_cache_bulk_lookup():
+    dbms = fresh_db()
+
+    hubs = [dbms.newItem(cache_name=f"CACHE_HUB{n}") for n in range(3)]
+    leaf = dbms.newItem(cache_name="CACHE_LEAF")
+
+    for hub in hubs[:2]:
+        hub.link(leaf)
+
+    dbms.commit()
+
+    result = dbms.neighbours(hubs)
+
+    assert [names(items) for items in result] == [["CACHE_LEAF"], ["CACHE_LEAF"], []]
+    assert names(dbms.neighbours([leaf], direction=LZDB_DIR_INCOMING)[0]) == ["CACHE_HUB0", "CACHE_HUB1"]
+
+
+def test_cache_follows_link_and_commit():
+    dbms = fresh_db()
+
+    a = dbms.newItem(cache_name="CACHE_A")
+    b = dbms.newItem(cache_name="CACHE_B")
+
+    dbms.commit()
+
+    assert dbms.neighbours(a) == []
+
+    a.link(b, LZDB_REL_UNDIRECTED)
+
+    assert dbms.neighbours(a) == [b]
+    assert dbms.neighbours(b) == [a]
+
+    dbms.commit()
+
+    assert dbms.neighbours(a) == [b]
+    assert dbms.neighbours(b, direction=LZDB_DIR_BOTH) == [a]
+
+
+def test_cache_undirected_stored_once():
+    conn = pg.connect(dbname="test", host="localhost")
+    dbms = LZDB(conn, linkcache=True, undirected_once=True)
+
+    a = dbms.newItem(cache_name="CACHE_ONCE_A")
+    b = dbms.newItem(cache_name="CACHE_ONCE_B")
+
+    a.link(b, LZDB_REL_UNDIRECTED)
+
+    dbms.commit()
+
+    assert dbms.neighbours(a) == [b]
+    assert dbms.neighbours(b) == [a]
+    assert dbms.neighbours(a, reltype=LZDB_REL_DIRECTED) == []
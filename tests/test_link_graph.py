@@ -0,0 +1,103 @@
+import uuid
+
+import numpy as np
+import psycopg as pg
+from lzdb import *
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(undirected_once=False):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False, undirected_once=undirected_once)
+    dbms.expose()
+    return dbms
+
+
+def neighbours(graph, item):
+    n = graph.index(item)
+    return {graph.node(m) for m in graph.indices[graph.indptr[n]:graph.indptr[n + 1]]}
+
+
+def key(item):
+    return (item.collection().number(), item.id())
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_graph_of_links():
+    dbms = fresh_db()
+    field = f"graph_{uuid.uuid4().hex[:8]}"
+
+    a = dbms.newItem(**{field: "A"})
+    b = dbms.newItem(**{field: "B"})
+    c = dbms.newItem(**{field: "C"})
+
+    a.link([b, c])
+    b.link(c, LZDB_REL_UNDIRECTED)
+
+    dbms.commit()
+
+    graph = dbms.linkGraph(collections=[a.collection()])
+
+    assert graph.size() == 3
+    assert len(graph.indptr) == 4
+    assert neighbours(graph, a) == {key(b), key(c)}
+    assert neighbours(graph, b) == {key(c)}
+    assert neighbours(graph, c) == {key(b)}
+
+    directed = dbms.linkGraph(reltype=LZDB_REL_DIRECTED, collections=[a.collection()])
+
+    assert neighbours(directed, a) == {key(b), key(c)}
+    assert neighbours(directed, b) == set()
+    assert directed.index(dbms.newItem(**{field: "D"})) is None
+
+
+def test_graph_undirected_stored_once():
+    dbms = fresh_db(undirected_once=True)
+    field = f"graph_{uuid.uuid4().hex[:8]}"
+
+    a = dbms.newItem(**{field: "A"})
+    b = dbms.newItem(**{field: "B"})
+
+    a.link(b, LZDB_REL_UNDIRECTED)
+
+    dbms.commit()
+
+    graph = dbms.linkGraph(collections=[a.collection().number()])
+
+    assert neighbours(graph, a) == {key(b)}
+    assert neighbours(graph, b) == {key(a)}
+
+
+def test_graph_as_sparse_matrix():
+    dbms = fresh_db()
+    field = f"graph_{uuid.uuid4().hex[:8]}"
+
+    items = [dbms.newItem(**{field: n}) for n in range(4)]
+
+    for x, y in zip(items, items[1:]):
+        x.link(y)
+
+    dbms.commit()
+
+    graph = dbms.linkGraph(collections=[items[0].collection()])
+    matrix = graph.matrix()
+
+    assert matrix.shape == (4, 4)
+    assert matrix.nnz == 3
+
+    # Two hops from the first item
+    start = np.zeros(4)
+    start[graph.index(items[0])] = 1
+
+    reached = (matrix.T @ (matrix.T @ start)).nonzero()[0]
+
+    assert [graph.node(n) for n in reached] == [key(items[2])]
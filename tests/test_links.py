@@ -128,3 +128,128 @@ def test_duplicate_link_inserted_once():
 
     assert cur.fetchone()[0] == 1
 
+
+def test_links_pending_until_commit():
+    dbms = fresh_db()
+
+    a = dbms.newItem(name="PENDING_A")
+    b = dbms.newItem(name="PENDING_B")
+    c = dbms.newItem(name="PENDING_C")
+
+    a.link(b)
+
+    assert len(a.pendingLinks()) == 1
+
+    dbms.commit()
+
+    assert a.pendingLinks() == []
+    assert len(a.links()) == 1
+
+    a.link(c, LZDB_REL_UNDIRECTED)
+
+    assert len(a.pendingLinks()) == 1
+
+    dbms.commit()
+
+    assert a.pendingLinks() == []
+    assert b in dbms.linkedItems(a)
+    assert c in dbms.linkedItems(a)
+    assert a in dbms.linkedItems(c)
+
+def test_link_between_loaded_items():
+    dbms = fresh_db()
+
+    a = dbms.newItem(name="LOADED_LINK_A")
+    b = dbms.newItem(name="LOADED_LINK_B")
+
+    dbms.commit()
+
+    dbms2 = LZDB(dbms.conn)
+
+    a2 = dbms2.items(collection=dbms2.collections(id=a.collection().id()), id=a.id())
+    b2 = dbms2.items(collection=dbms2.collections(id=b.collection().id()), id=b.id())
+
+    assert not a2.isDirty()
+
+    a2.link(b2)
+
+    dbms2.commit()
+
+    assert b2 in dbms2.linkedItems(a2)
+
+def test_incoming_items():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(name="INCOMING_SAT")
+    other = dbms.newItem(name="INCOMING_OTHER")
+    measure = dbms.newItem(timestamp="INCOMING_T", value="1")
+
+    sat.link(measure)
+    other.link(measure, LZDB_REL_UNDIRECTED)
+
+    dbms.commit()
+
+    incoming = dbms.incomingItems(measure)
+
+    assert len(incoming) == 2
+    assert any(item is sat for item in incoming)
+    assert any(item is other for item in incoming)
+
+    assert dbms.incomingItems(measure, LZDB_REL_DIRECTED) == [sat]
+    assert dbms.incomingItems(sat) == []
+
+    cur = dbms.conn.cursor()
+    cur.execute("select to_regclass('lzdb_links_dst_idx') is not null")
+
+    assert cur.fetchone()[0]
+
+def test_undirected_link_stored_once():
+    conn = pg.connect(dbname="test", host="localhost")
+    dbms = LZDB(conn, undirected_once=True)
+
+    a = dbms.newItem(name="ONCE_A")
+    b = dbms.newItem(name="ONCE_B")
+
+    a.link(b, LZDB_REL_UNDIRECTED)
+
+    dbms.commit()
+
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*)
+        FROM lzdb_links
+        WHERE (src_collection, src_id) IN ((%s, %s), (%s, %s))
+    """, (a.collection().number(), a.id(), b.collection().number(), b.id()))
+
+    assert cur.fetchone()[0] == 1
+
+    assert dbms.linkedItems(a) == [b]
+    assert dbms.linkedItems(b) == [a]
+    assert dbms.incomingItems(a) == [b]
+    assert [item for item, depth, path in dbms.traverse(b)] == [a]
+
+
+def test_undirected_link_stored_once_from_either_end():
+    conn = pg.connect(dbname="test", host="localhost")
+    dbms = LZDB(conn, undirected_once=True)
+
+    a = dbms.newItem(name="ONCE_EITHER_A")
+    b = dbms.newItem(name="ONCE_EITHER_B")
+
+    a.link(b, LZDB_REL_UNDIRECTED)
+    dbms.commit()
+
+    b.link(a, LZDB_REL_UNDIRECTED)
+    dbms.commit()
+
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*)
+        FROM lzdb_links
+        WHERE (src_collection, src_id) IN ((%s, %s), (%s, %s))
+    """, (a.collection().number(), a.id(), b.collection().number(), b.id()))
+
+    assert cur.fetchone()[0] == 1
+
+    assert dbms.linkedItems(a) == [b]
+    assert dbms.linkedItems(b) == [a]
@@ -0,0 +1,129 @@
+import pandas as pd
+from lzdb import *
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class FrameLoader(object):
+    """
+    Loader of n-row frames, counting the loads.
+    """
+    def __init__(self):
+        self.loads = []
+
+    def get(self, name):
+        self.loads.append(name)
+        return pd.DataFrame({"value": range(1000), "name": [name] * 1000})
+
+
+def frame_size():
+    return int(FrameLoader().get("x").memory_usage(deep=True).sum())
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_lzdict_without_budget_keeps_everything():
+    loader = FrameLoader()
+    dd = lzdict(loader)
+
+    for name in ["a", "b", "c", "a"]:
+        dd[name]
+
+    assert loader.loads == ["a", "b", "c"]
+    assert dd.stats()["hits"] == 1
+    assert dd.stats()["misses"] == 3
+    assert dd.stats()["evictions"] == 0
+
+
+def test_lzdict_evicts_least_recently_used():
+    loader = FrameLoader()
+    dd = lzdict(loader, budget=2 * frame_size())
+
+    dd["a"]
+    dd["b"]
+    dd["a"]
+    dd["c"]
+
+    assert sorted(dd) == ["a", "c"]
+    assert dd.memoryUsage() <= 2 * frame_size()
+    assert dd.stats()["evictions"] == 1
+
+    # Evicted values come back on access
+    assert list(dd["b"]["name"].unique()) == ["b"]
+    assert loader.loads == ["a", "b", "c", "b"]
+    assert sorted(dd) == ["b", "c"]
+
+
+def test_lzdict_pinned_values_stay():
+    loader = FrameLoader()
+    dd = lzdict(loader, budget=frame_size())
+
+    dd.pin("a")
+    dd["b"]
+    dd["c"]
+
+    assert "a" in dd
+    assert sorted(dd) == ["a", "c"]
+
+    dd.unpin("a")
+
+    assert sorted(dd) == ["c"]
+    assert dd.stats()["evictions"] == 2
+
+
+def test_lzdict_reads_parquet(tmp_path):
+    frame = pd.DataFrame({"value": [1, 2, 3]})
+    frame.to_parquet(tmp_path / "orbit_2024.parquet")
+
+    class Loader(lzdict.parquet):
+        def get(self, name):
+            return super().get(name, folder=str(tmp_path))
+
+    dd = lzdict(Loader(), budget=10 ** 6)
+
+    assert dd["orbit"]["value"].tolist() == [1, 2, 3]
+    assert dd["missing"] is None
+    assert dd.stats()["bytes"] > 0
+
+
+def test_lzdict_projection_and_filters(tmp_path):
+    frame = pd.DataFrame({
+        "day": [1] * 100 + [2] * 100 + [3] * 100,
+        "value": range(300),
+        "label": ["x"] * 300,
+    })
+    frame.to_parquet(tmp_path / "orbit_2024.parquet", row_group_size=100)
+
+    reads = []
+
+    class Loader(lzdict.parquet):
+        def get(self, name, **options):
+            reads.append(options)
+            return super().get(name, folder=str(tmp_path), **options)
+
+    dd = lzdict(Loader())
+
+    part = dd.get("orbit", columns=["day", "value"], filters=[("day", "=", 2)])
+
+    assert list(part.columns) == ["day", "value"]
+    assert part["value"].tolist() == list(range(100, 200))
+
+    # Cached per (file, columns, filters)
+    dd.get("orbit", columns=["day", "value"], filters=[("day", "=", 2)])
+    dd.get("orbit", columns=["value"], filters=[("day", "in", [1, 3])])
+    dd.get("orbit")
+
+    assert len(reads) == 3
+    assert dd.stats()["hits"] == 1
+
+    handle = dd.lazy("orbit", columns=["value"], filters=[("day", ">=", 3)])
+
+    assert len(reads) == 3
+    assert handle["value"].min() == 200
+    assert len(handle) == 100
+    assert handle.shape == (100, 1)
+    assert len(reads) == 4
@@ -0,0 +1,101 @@
+import uuid
+
+import pytest
+import psycopg as pg
+from lzdb import *
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(**kwargs):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    return LZDB(conn, traceon=False, **kwargs)
+
+
+def unique_field():
+    return f"par_{uuid.uuid4().hex[:8]}"
+
+
+def populate(dbms, field):
+    sats = [dbms.newItem(**{field: f"SAT{n}"}) for n in range(5)]
+
+    measurements = [
+        dbms.newItem(**{f"{field}_m": n, "satellite": sats[n % 5]})
+        for n in range(200)
+    ]
+
+    for n in range(10):
+        dbms.newItem(**{f"{field}_r": n, "measurement": measurements[n * 7]})
+
+    dbms.commit()
+
+
+def snapshot(dbms, field):
+    rows = []
+
+    for item in dbms.items():
+        if f"{field}_m" in item:
+            rows.append(("m", item[f"{field}_m"], item["satellite"][field]))
+        elif f"{field}_r" in item:
+            measurement = item["measurement"]
+            rows.append(("r", item[f"{field}_r"], measurement[f"{field}_m"], measurement["satellite"][field]))
+
+    return sorted(rows, key=repr)
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_parallel_load_matches_sequential():
+    field = unique_field()
+    populate(fresh_db(), field)
+
+    sequential = snapshot(fresh_db(), field)
+    parallel = fresh_db(load_workers=4)
+
+    assert len(sequential) == 200 + 10
+    assert snapshot(parallel, field) == sequential
+    assert all(collection.isLoaded() for collection in parallel.collections())
+
+
+def test_parallel_load_from_pool():
+    psycopg_pool = pytest.importorskip("psycopg_pool")
+    field = unique_field()
+    populate(fresh_db(), field)
+
+    with psycopg_pool.ConnectionPool("dbname=test host=localhost", min_size=3, max_size=3) as pool:
+        dbms = LZDB(pool, load_workers=3)
+
+        assert snapshot(dbms, field) == snapshot(fresh_db(), field)
+
+
+def test_parallel_load_reads_one_snapshot(monkeypatch):
+    field = unique_field()
+    populate(fresh_db(), field)
+
+    table = fresh_db(lazy=True).collections(ukeys=[field]).id()
+    read_fkeys = Collection.read_fkeys
+    late = []
+
+    def insert_late(collection, id):
+        # Committed once the workers have started reading
+        if id == table and not late:
+            with pg.connect(dbname="test", host="localhost") as other:
+                other.execute(f"INSERT INTO {table} ({field}) VALUES ('LATE')")
+            late.append(id)
+
+        return (yield from read_fkeys(collection, id))
+
+    monkeypatch.setattr(Collection, "read_fkeys", insert_late)
+
+    dbms = fresh_db(load_workers=2)
+
+    assert late == [table]
+    assert len(dbms.items(**{field: "SAT0"})) == 1
+    assert dbms.items(**{field: "LATE"}) == []
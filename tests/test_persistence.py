@@ -1,3 +1,6 @@
+import uuid
+
+import pytest
 import psycopg as pg
 from lzdb import LZDB
 
@@ -46,3 +49,328 @@ def test_reload_persists_items():
 
     assert loaded["param"] == "2004"
 
+
+def test_reload_item_lookup_by_id():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(
+        name="IDENTITY_SAT"
+    )
+
+    dbms.commit()
+
+    assert dbms.items(collection=sat.collection(), id=sat.id()) is sat
+
+    dbms2 = LZDB(dbms.conn)
+
+    collection = dbms2.collections(id=sat.collection().id())
+    loaded = dbms2.items(collection=collection, id=sat.id())
+
+    assert loaded is not None
+    assert loaded["name"] == "IDENTITY_SAT"
+    assert "__loading" not in loaded
+    assert not loaded.isDirty()
+
+def test_bulk_insert_assigns_ids_in_creation_order():
+    dbms = fresh_db()
+
+    items = [
+        dbms.newItem(bulk_param=str(i), bulk_tag="BULK_ORDER")
+        for i in range(50)
+    ]
+
+    dbms.commit()
+
+    ids = [item.id() for item in items]
+
+    assert None not in ids
+    assert ids == sorted(ids)
+    assert all(item.isLoaded() and not item.isDirty() for item in items)
+
+    cur = dbms.conn.cursor()
+    cur.execute(f"""
+        SELECT id, bulk_param
+        FROM {items[0].collection().id()}
+        WHERE bulk_tag = 'BULK_ORDER'
+        AND id = ANY(%s)
+    """, (ids,))
+
+    stored = dict(cur.fetchall())
+
+    assert stored == {item.id(): item["bulk_param"] for item in items}
+
+
+def test_bulk_insert_references_created_later():
+    dbms = fresh_db()
+
+    event = dbms.newItem(bulk_timestamp="BULK_FK_EVENT")
+    sat = dbms.newItem(bulk_name="BULK_FK_SAT")
+
+    event["bulk_satellite"] = sat
+
+    dbms.commit()
+
+    cur = dbms.conn.cursor()
+    cur.execute(f"""
+        SELECT bulk_satellite
+        FROM {event.collection().id()}
+        WHERE id = {event.id()}
+    """)
+
+    assert cur.fetchone()[0] == sat.id()
+
+def test_bulk_insert_forgets_requested_id():
+    dbms = fresh_db()
+
+    requested = 10**9
+    item = dbms.newItem(id=requested, bulk_name="BULK_REQUESTED_ID")
+    collection = item.collection()
+
+    assert collection.item(requested) is item
+
+    dbms.commit()
+
+    assert item.id() != requested
+    assert collection.item(requested) is None
+    assert collection.item(item.id()) is item
+
+
+def test_update_writes_changed_fields_only():
+    dbms = fresh_db()
+
+    item = dbms.newItem(
+        dirty_name="DIRTY_FIELDS",
+        dirty_operator="ESA"
+    )
+
+    dbms.commit()
+
+    assert item.changedFields() == []
+
+    # Concurrent change to another column must survive the update
+    cur = dbms.conn.cursor()
+    cur.execute(
+        f"UPDATE {item.collection().id()} SET dirty_operator='NASA' WHERE id=%s",
+        (item.id(),)
+    )
+
+    item["dirty_name"] = "DIRTY_FIELDS_RENAMED"
+
+    assert item.changedFields() == ["dirty_name"]
+
+    dbms.commit()
+
+    cur.execute(
+        f"SELECT dirty_name, dirty_operator FROM {item.collection().id()} WHERE id=%s",
+        (item.id(),)
+    )
+
+    assert cur.fetchone() == ("DIRTY_FIELDS_RENAMED", "NASA")
+    assert not item.isDirty()
+
+def test_new_fields_of_several_items_added_in_one_commit():
+    dbms = fresh_db()
+
+    sat = dbms.newItem(schema_name="SCHEMA_SAT")
+    a = dbms.newItem(schema_event="SCHEMA_A")
+    b = dbms.newItem(schema_event="SCHEMA_B")
+
+    dbms.commit()
+
+    a["schema_operator"] = "ESA"
+    b["schema_year"] = "1998"
+    b["schema_satellite"] = sat
+
+    dbms.commit()
+
+    cur = dbms.conn.cursor()
+    cur.execute(f"""
+        SELECT schema_operator, schema_year, schema_satellite
+        FROM {a.collection().id()}
+        WHERE id = ANY(%s)
+        ORDER BY id
+    """, ([a.id(), b.id()],))
+
+    assert cur.fetchall() == [
+        ("ESA", None, None),
+        (None, "1998", sat.id())
+    ]
+
+def test_new_fields_added_again_after_failed_commit():
+    dbms = fresh_db()
+
+    # Column missing at the start of every run
+    field = f"retry_{uuid.uuid4().hex[:8]}"
+
+    sat = dbms.newItem(retry_name="RETRY_SAT")
+    event = dbms.newItem(retry_satellite=sat)
+    dbms.commit()
+
+    event[field] = "ESA"
+
+    # Fails after the ALTER TABLE adding field
+    broken = dbms.newItem(retry_satellite=sat)
+    broken["retry_satellite"] = "RETRY_NOT_AN_ID"
+
+    with pytest.raises(pg.DataError):
+        dbms.commit()
+
+    dbms.conn.rollback()
+
+    broken["retry_satellite"] = sat
+    dbms.commit()
+
+    cur = dbms.conn.cursor()
+    cur.execute(f"""
+        SELECT {field}, retry_satellite
+        FROM {event.collection().id()}
+        WHERE id = ANY(%s)
+        ORDER BY id
+    """, ([event.id(), broken.id()],))
+
+    assert cur.fetchall() == [("ESA", sat.id()), (None, sat.id())]
+
+
+def test_new_collections_created_again_after_failed_commit():
+    dbms = fresh_db()
+
+    # Collections new to every run
+    name = f"retry_{uuid.uuid4().hex[:8]}"
+
+    sat = dbms.newItem(**{name: "RETRY_NEW_SAT"})
+    event = dbms.newItem(**{f"{name}_satellite": sat})
+    event[f"{name}_satellite"] = "RETRY_NOT_AN_ID"
+
+    with pytest.raises(pg.DataError):
+        dbms.commit()
+
+    dbms.conn.rollback()
+
+    assert sat.isDirty() and not sat.isLoaded()
+
+    event[f"{name}_satellite"] = sat
+    dbms.commit()
+
+    reloaded = fresh_db()
+    [found] = reloaded.items(**{name: "RETRY_NEW_SAT"})
+
+    assert found.id() == sat.id()
+    assert reloaded.items(**{f"{name}_satellite": found})[0].id() == event.id()
+
+
+def test_reload_parses_datetimes():
+    import datetime
+
+    dbms = fresh_db()
+
+    when = datetime.datetime(2000, 1, 3, 12, 30, 0)
+
+    item = dbms.newItem(
+        datetime_param="DATETIME_RELOAD",
+        datetime_start=when
+    )
+
+    dbms.commit()
+
+    dbms2 = LZDB(dbms.conn)
+
+    collection = dbms2.collections(id=item.collection().id())
+    loaded = dbms2.items(collection=collection, id=item.id())
+
+    assert loaded["datetime_start"] == when
+    assert loaded["datetime_param"] == "DATETIME_RELOAD"
+    assert loaded.isLoaded()
+    assert not loaded.isDirty()
+
+
+def test_reload_parses_date_strings_by_column():
+    import datetime
+
+    dbms = fresh_db()
+
+    first = dbms.newItem(
+        textdate_param="TEXTDATE_RELOAD",
+        textdate_start="2000-01-03 12:30:00"
+    )
+
+    second = dbms.newItem(
+        textdate_param="TEXTDATE_RELOAD",
+        textdate_start="03-jan-2000:00:00:00"
+    )
+
+    dbms.commit()
+
+    dbms2 = LZDB(dbms.conn)
+
+    collection = dbms2.collections(id=first.collection().id())
+
+    loaded = dbms2.items(collection=collection, id=first.id())
+    other = dbms2.items(collection=collection, id=second.id())
+
+    assert loaded["textdate_start"] == datetime.datetime(2000, 1, 3, 12, 30)
+    assert other["textdate_start"] == "03-jan-2000:00:00:00"
+
+
+def test_reload_reference_within_collection():
+    dbms = fresh_db()
+
+    parent = dbms.newItem(selfref_name="SELFREF_PARENT")
+    child = dbms.newItem(selfref_name="SELFREF_CHILD")
+
+    dbms.commit()
+
+    child["selfref_parent"] = parent
+    parent["selfref_parent"] = child
+
+    dbms.commit()
+
+    dbms2 = LZDB(dbms.conn)
+
+    collection = dbms2.collections(id=child.collection().id())
+
+    loaded_parent = dbms2.items(collection=collection, id=parent.id())
+    loaded_child = dbms2.items(collection=collection, id=child.id())
+
+    assert loaded_child["selfref_parent"] is loaded_parent
+    assert loaded_parent["selfref_parent"] is loaded_child
+    assert not loaded_child.isDirty()
+
+
+def test_date_strings_read_alike_on_every_path():
+    import datetime
+
+    dbms = fresh_db()
+
+    items = [
+        dbms.newItem(samedate_param="SAMEDATE", samedate_start="n/a"),
+        dbms.newItem(samedate_param="SAMEDATE", samedate_start="2000-01-03 12:30:00"),
+    ]
+
+    dbms.commit()
+
+    collection = items[0].collection()
+    ids = {item.id() for item in items}
+    expected = {
+        items[0].id(): "n/a",
+        items[1].id(): datetime.datetime(2000, 1, 3, 12, 30),
+    }
+
+    loaded = LZDB(dbms.conn)
+    coll = loaded.collections(id=collection.id())
+
+    streamed = LZDB(dbms.conn, lazy=True)
+    queried = LZDB(dbms.conn, lazy=True)
+
+    paths = [
+        [loaded.items(collection=coll, id=id) for id in ids],
+        [item for item in streamed.iterItems(streamed.collections(id=collection.id()))
+         if item.id() in ids],
+        queried.query(
+            queried.collections(id=collection.id()),
+            id__in=sorted(ids),
+            page_size=1
+        ).all(),
+    ]
+
+    for path in paths:
+        assert {item.id(): item["samedate_start"] for item in path} == expected
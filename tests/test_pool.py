@@ -0,0 +1,117 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import psycopg as pg
+from lzdb import *
+
+psycopg_pool = pytest.importorskip("psycopg_pool")
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_pool(size=4):
+    return psycopg_pool.ConnectionPool(
+        "dbname=test host=localhost",
+        min_size=size,
+        max_size=size,
+        open=True
+    )
+
+
+def unique_field():
+    return f"pool_{uuid.uuid4().hex[:8]}"
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_pool_commit_and_reload():
+    pool = fresh_pool()
+    field = unique_field()
+
+    dbms = LZDB(pool)
+
+    assert dbms.conn is None
+
+    sat = dbms.newItem(**{field: "SAT"})
+    m = dbms.newItem(**{field: "M", "satellite": sat})
+    sat.link(m)
+
+    dbms.commit()
+
+    # Every connection is back in the pool, outside of a transaction
+    assert pool.get_stats()["pool_available"] == 4
+
+    with pool.connection() as conn:
+        assert conn.info.transaction_status == pg.pq.TransactionStatus.IDLE
+
+    reloaded = LZDB(pool, lazy=True)
+    coll = reloaded.collections(id=m.collection().id())
+
+    found = reloaded.query(coll, **{field: "M"}).first()
+
+    assert found["satellite"][field] == "SAT"
+    assert [item[field] for item in reloaded.linkedItems(found["satellite"])] == ["M"]
+
+    pool.close()
+
+
+def test_pool_concurrent_reads():
+    pool = fresh_pool()
+    field = unique_field()
+
+    dbms = LZDB(pool)
+
+    hubs = [dbms.newItem(**{field: f"HUB{n}"}) for n in range(8)]
+
+    for n, hub in enumerate(hubs):
+        hub.link([dbms.newItem(**{field: f"LEAF{n}_{k}"}) for k in range(n + 1)])
+
+    dbms.commit()
+
+    reader = LZDB(pool, lazy=True)
+    coll = reader.collections(id=hubs[0].collection().id())
+    ids = [hub.id() for hub in hubs] * 4
+
+    def linked(id):
+        hub = reader.query(coll, id=id).first()
+        return hub[field], sorted(item[field] for item in reader.linkedItems(hub))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(linked, ids))
+
+    for (name, leaves), id in zip(results, ids):
+        n = [hub.id() for hub in hubs].index(id)
+        assert name == f"HUB{n}"
+        assert leaves == sorted(f"LEAF{n}_{k}" for k in range(n + 1))
+
+    # Each row joined the session once
+    assert len(reader.items(collection=coll)) == 8 + 36
+
+    pool.close()
+
+
+def test_pool_concurrent_lazy_load():
+    pool = fresh_pool()
+    field = unique_field()
+
+    dbms = LZDB(pool)
+
+    for n in range(100):
+        dbms.newItem(**{field: n})
+
+    dbms.commit()
+
+    reader = LZDB(pool, lazy=True)
+    coll = reader.query([field], **{field: 0}).collection()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sizes = list(executor.map(lambda _: len(reader.items(collection=coll)), range(8)))
+
+    assert sizes == [100] * 8
+
+    pool.close()
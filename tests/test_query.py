@@ -0,0 +1,168 @@
+import datetime
+import uuid
+
+import pytest
+import psycopg as pg
+from lzdb import LZDB
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(lazy=False):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False, lazy=lazy)
+    dbms.expose()
+    return dbms
+
+
+def marker():
+    # Value unique to the run, as the database is shared between runs
+    return uuid.uuid4().hex[:8]
+
+
+def populate(dbms, run):
+    sat = dbms.newItem(query_sat=f"QUERY_SAT_{run}")
+    other = dbms.newItem(query_sat=f"QUERY_OTHER_{run}")
+
+    for n in range(10):
+        dbms.newItem(
+            query_satellite=sat if n % 2 else other,
+            query_rank=n,
+            query_tag=f"TAG{n % 3}_{run}"
+        )
+
+    dbms.commit()
+
+    return sat
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_query_filters_in_database():
+    run = marker()
+    populate(fresh_db(), run)
+
+    lazy = fresh_db(lazy=True)
+
+    found = lazy.query(
+        "query_rank,query_satellite,query_tag",
+        query_rank__gte=2,
+        query_rank__lt=8,
+        query_tag=f"TAG1_{run}",
+        order_by="-query_rank"
+    ).all()
+
+    assert [item["query_rank"] for item in found] == [7, 4]
+
+    collection = found[0].collection()
+
+    assert not collection.isLoaded()
+    assert collection.item(found[0].id()) is found[0]
+
+
+def test_query_foreign_key_by_item():
+    run = marker()
+    populate(fresh_db(), run)
+
+    lazy = fresh_db(lazy=True)
+
+    sat = lazy.query(["query_sat"], query_sat=f"QUERY_SAT_{run}").first()
+
+    found = lazy.query(
+        ["query_satellite", "query_rank", "query_tag"],
+        query_satellite=sat,
+        limit=3
+    ).all()
+
+    assert [item["query_rank"] for item in found] == [1, 3, 5]
+    assert all(item["query_satellite"] is sat for item in found)
+
+
+def test_query_in_and_null():
+    run = marker()
+    dbms = fresh_db()
+
+    dbms.newItem(query_null_tag=f"A_{run}", query_null_value=1)
+    dbms.newItem(query_null_tag=f"B_{run}", query_null_value=None)
+    dbms.newItem(query_null_tag=f"C_{run}", query_null_value=3)
+
+    dbms.commit()
+
+    signature = "query_null_tag,query_null_value"
+    tags = [f"A_{run}", f"B_{run}", f"C_{run}"]
+
+    nulls = dbms.query(signature, query_null_tag__in=tags, query_null_value=None).all()
+    some = dbms.query(signature, query_null_tag__in=[tags[0], tags[2]])
+    both = dbms.query(signature, query_null_tag__in=tags, query_null_value__in=[1, None])
+
+    assert [item["query_null_tag"] for item in nulls] == [tags[1]]
+    assert some.count() == 2
+    assert [item["query_null_tag"] for item in both] == tags[:2]
+
+
+def test_query_returns_session_items():
+    dbms = fresh_db()
+
+    sat = populate(dbms, marker())
+
+    found = dbms.query(sat.collection(), query_sat=sat["query_sat"]).all()
+
+    assert found == [sat]
+    assert found[0] is sat
+
+
+def test_query_projection_and_paging():
+    run = marker()
+    populate(fresh_db(), run)
+
+    lazy = fresh_db(lazy=True)
+
+    rows = lazy.query(
+        "query_rank,query_satellite,query_tag",
+        query_tag__startswith="TAG",
+        query_tag__in=[f"TAG{n}_{run}" for n in range(3)],
+        fields=["query_rank"],
+        page_size=4
+    ).all()
+
+    assert [row["query_rank"] for row in rows] == list(range(10))
+    assert set(rows[0]) == {"id", "query_rank"}
+
+
+def test_query_text_fields_with_typed_values():
+    run = marker()
+    dbms = fresh_db()
+
+    # Text columns, as created before typed columns
+    item = dbms.newItem(
+        query_text_run=run,
+        query_text_param="2004",
+        query_text_start="2000-01-03 00:00:00"
+    )
+
+    dbms.commit()
+
+    signature = "query_text_param,query_text_run,query_text_start"
+
+    found = dbms.query(
+        signature,
+        query_text_run=run,
+        query_text_param=2004,
+        query_text_start__gte=datetime.datetime(2000, 1, 3)
+    ).all()
+
+    assert found == [item]
+    assert dbms.query(signature, query_text_run=run, query_text_param__in=[2004, 2005]).count() == 1
+
+    with pytest.raises(ValueError):
+        dbms.query(item.collection(), id__startswith="1").all()
+
+    # The session transaction is still usable
+    dbms.commit()
@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+
+import psycopg as pg
+from lzdb import LZDB
+from lzdb.steps import run
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db():
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False)
+    dbms.expose()
+    return dbms
+
+
+def unique(name):
+    # Fields unique to the run, so that each run gets new tables
+    return f"tidx_{uuid.uuid4().hex[:8]}_{name}"
+
+
+def indexes(dbms, table):
+    cur = dbms.conn.cursor()
+    cur.execute(
+        """
+        SELECT indexname FROM pg_indexes WHERE tablename = %s
+        """,
+        (table,)
+    )
+    names = [row[0] for row in cur.fetchall()]
+    dbms.conn.commit()
+    return names
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_foreign_key_indexed_on_commit():
+    dbms = fresh_db()
+
+    satellite = unique("satellite")
+
+    sat = dbms.newItem(**{unique("name"): "TIDX_SAT"})
+    event = dbms.newItem(**{satellite: sat})
+
+    dbms.commit()
+
+    table = event.collection().id()
+
+    assert f"{table}_{satellite}_idx" in indexes(dbms, table)
+    assert (table, satellite, "foreign key") in dbms.createdIndexes()
+
+
+def test_filter_field_indexed_past_threshold():
+    dbms = fresh_db()
+
+    tag = unique("tag")
+
+    for n in range(5):
+        dbms.newItem(**{tag: f"TAG{n}"})
+
+    dbms.commit()
+
+    item = dbms.items(**{tag: "TAG0"})[0]
+    table = item.collection().id()
+
+    for n in range(item.collection().tableIndexThreshold - 1):
+        dbms.query(item.collection(), **{tag: "TAG1"}).all()
+
+    dbms.createIndexes()
+
+    assert f"{table}_{tag}_idx" not in indexes(dbms, table)
+
+    dbms.query(item.collection(), **{tag: "TAG1"}).all()
+
+    assert dbms.createIndexes() == [(table, tag, "filter")]
+    assert f"{table}_{tag}_idx" in indexes(dbms, table)
+    assert (table, tag, "filter") in dbms.createdIndexes()
+
+
+def test_failed_index_build_cleaned_up():
+    dbms = fresh_db()
+
+    blob = unique("blob")
+
+    # Values too large for a btree entry
+    item = dbms.newItem(**{blob: os.urandom(20000)})
+
+    dbms.commit()
+
+    collection = item.collection()
+    table = collection.id()
+
+    for n in range(collection.tableIndexThreshold):
+        dbms.query(collection, **{f"{blob}__isnull": False}).count()
+
+    assert dbms.createIndexes() == []
+
+    assert f"{table}_{blob}_idx" not in indexes(dbms, table)
+    assert (table, blob, "filter") not in dbms.createdIndexes()
+    assert run(dbms.conn.cursor(), collection.wantedIndexes()) == {}
+
+
+def test_commit_does_not_wait_for_open_transactions():
+    dbms = fresh_db()
+    dbms.indexLockTimeout = "5s"
+
+    tag = unique("tag")
+
+    item = dbms.newItem(**{tag: "TAG0"})
+    dbms.commit()
+
+    collection = item.collection()
+    table = collection.id()
+
+    for n in range(collection.tableIndexThreshold):
+        dbms.query(collection, **{tag: "TAG0"}).all()
+
+    # A snapshot held by another session holds up concurrent builds
+    other = pg.connect(dbname="test", host="localhost")
+    other.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    other.execute(f"SELECT count(*) FROM {table}")
+
+    try:
+        item[tag] = "TAG1"
+
+        started = time.monotonic()
+        dbms.commit()
+
+        assert time.monotonic() - started < 2
+        assert f"{table}_{tag}_idx" not in indexes(dbms, table)
+    finally:
+        other.close()
+
+    autocommit = dbms.conn.autocommit
+
+    assert dbms.createIndexes() == [(table, tag, "filter")]
+    assert dbms.conn.autocommit == autocommit
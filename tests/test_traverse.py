@@ -0,0 +1,97 @@
+import psycopg as pg
+from lzdb import *
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db(lazy=False):
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False, lazy=lazy)
+    dbms.expose()
+    return dbms
+
+
+def cycle(dbms):
+    """
+    a -> b -> c -> a, plus an undirected a - d.
+    """
+    a = dbms.newItem(traverse_node="A")
+    b = dbms.newItem(traverse_node="B")
+    c = dbms.newItem(traverse_node="C")
+    d = dbms.newItem(traverse_other="D")
+
+    a.link(b)
+    b.link(c)
+    c.link(a)
+    a.link(d, LZDB_REL_UNDIRECTED)
+
+    dbms.commit()
+
+    return a, b, c, d
+
+
+def summary(result):
+    return [
+        (item["traverse_node"] if "traverse_node" in item else item["traverse_other"], depth)
+        for item, depth, path in result
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_traverse_outgoing_stops_at_cycles():
+    dbms = fresh_db()
+
+    a, b, c, d = cycle(dbms)
+
+    result = dbms.traverse(a, depth=5)
+
+    assert sorted(summary(result)) == [("B", 1), ("C", 2), ("D", 1)]
+
+    item, depth, path = [entry for entry in result if entry[0] is c][0]
+
+    assert path == [a, b, c]
+
+
+def test_traverse_depth_and_reltype():
+    dbms = fresh_db()
+
+    a, b, c, d = cycle(dbms)
+
+    assert sorted(summary(dbms.traverse(a, depth=1))) == [("B", 1), ("D", 1)]
+    assert summary(dbms.traverse(a, depth=3, reltype=LZDB_REL_UNDIRECTED)) == [("D", 1)]
+
+
+def test_traverse_incoming():
+    dbms = fresh_db()
+
+    a, b, c, d = cycle(dbms)
+
+    result = dbms.traverse(c, depth=2, direction=LZDB_DIR_INCOMING)
+
+    assert summary(result) == [("B", 1), ("A", 2)]
+    assert result[1][2] == [c, b, a]
+
+
+def test_traverse_resolves_items_lazily():
+    dbms = fresh_db()
+
+    a, b, c, d = cycle(dbms)
+
+    lazy = fresh_db(lazy=True)
+
+    start = lazy.query(a.collection().uniqueKeys(), id=a.id()).first()
+
+    result = lazy.traverse(start, depth=2)
+
+    assert sorted((item.id(), depth) for item, depth, path in result) == sorted(
+        [(b.id(), 1), (c.id(), 2), (d.id(), 1)]
+    )
+    assert not lazy.collections(id=d.collection().id()).isLoaded()
@@ -0,0 +1,149 @@
+import datetime
+import uuid
+
+import psycopg as pg
+from lzdb import LZDB
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def fresh_db():
+    conn = pg.connect(
+        dbname="test",
+        host="localhost"
+    )
+    dbms = LZDB(conn, traceon=False)
+    dbms.expose()
+    return dbms
+
+
+def column_types(dbms, table):
+    cur = dbms.conn.cursor()
+    cur.execute(
+        """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = %s
+        """,
+        (table,)
+    )
+    return dict(cur.fetchall())
+
+
+# ---------------------------------------------------------------------------
+# Tests
+# ---------------------------------------------------------------------------
+
+def test_typed_columns_round_trip():
+    dbms = fresh_db()
+
+    stamp = datetime.datetime(2000, 1, 3, 12, 30, tzinfo=datetime.timezone.utc)
+
+    item = dbms.newItem(
+        types_name="TYPES_ROUND_TRIP",
+        types_count=42,
+        types_ratio=0.5,
+        types_flag=True,
+        types_time=stamp,
+        types_blob=b"\x00\x01",
+        types_meta={"k": [1, 2]}
+    )
+
+    dbms.commit()
+
+    types = column_types(dbms, item.collection().id())
+
+    assert types["types_count"] == "bigint"
+    assert types["types_ratio"] == "double precision"
+    assert types["types_flag"] == "boolean"
+    assert types["types_time"] == "timestamp with time zone"
+    assert types["types_blob"] == "bytea"
+    assert types["types_meta"] == "jsonb"
+
+    reloaded = LZDB(dbms.conn).items(
+        collection=item.collection(), id=item.id()
+    )
+
+    assert reloaded["types_count"] == 42
+    assert reloaded["types_ratio"] == 0.5
+    assert reloaded["types_flag"] is True
+    assert reloaded["types_time"] == stamp
+    assert bytes(reloaded["types_blob"]) == b"\x00\x01"
+    assert reloaded["types_meta"] == {"k": [1, 2]}
+
+
+def test_new_field_typed_and_widened():
+    dbms = fresh_db()
+
+    # Fields unique to the run: a column is only widened once
+    prefix = f"types_{uuid.uuid4().hex[:8]}"
+    value = f"{prefix}_value"
+
+    item = dbms.newItem(**{f"{prefix}_name": "TYPES_WIDEN"})
+
+    dbms.commit()
+
+    table = item.collection().id()
+
+    item[value] = 1
+
+    dbms.commit()
+
+    assert column_types(dbms, table)[value] == "bigint"
+
+    item[value] = 1.5
+
+    dbms.commit()
+
+    assert column_types(dbms, table)[value] == "double precision"
+
+    item[value] = "n/a"
+
+    dbms.commit()
+
+    assert column_types(dbms, table)[value] == "character varying"
+
+    reloaded = LZDB(dbms.conn).items(
+        collection=item.collection(), id=item.id()
+    )
+
+    assert reloaded[value] == "n/a"
+
+
+def test_integers_beyond_bigint_kept_exact():
+    dbms = fresh_db()
+
+    prefix = f"types_{uuid.uuid4().hex[:8]}"
+    value = f"{prefix}_value"
+
+    item = dbms.newItem(**{f"{prefix}_name": "TYPES_HUGE", value: 2**70})
+    small = dbms.newItem(**{f"{prefix}_name": "TYPES_SMALL", value: -5})
+
+    dbms.commit()
+
+    table = item.collection().id()
+
+    assert column_types(dbms, table)[value] == "numeric"
+
+    small[value] = 2.5
+
+    dbms.commit()
+
+    assert column_types(dbms, table)[value] == "numeric"
+
+    reloaded = LZDB(dbms.conn)
+    huge = reloaded.items(collection=item.collection(), id=item.id())
+
+    assert huge[value] == 2**70
+    assert type(huge[value]) is int
+    assert reloaded.items(collection=small.collection(), id=small.id())[value] == 2.5
+
+    lazy = LZDB(dbms.conn, lazy=True)
+    found = lazy.query(
+        [f"{prefix}_name", value], fields=[value], **{value: 2**70}
+    ).all()
+
+    assert found == [{"id": item.id(), value: 2**70}]
+    assert type(found[0][value]) is int